@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from recipes.cache_versions import (
+    find_version,
+    forget_version,
+    get_version,
+    token_scope,
+)
+
+
+CACHE_KEY = 'auth_tokens:{}:{}'
+# Поля пользователя, которые меняются запросами UPDATE в обход save()
+# и сигналов. Они не кэшируются и загружаются из БД при обращении.
+DEFERRED_USER_FIELDS = (
+    'avatar_thumbnails',
+    *get_user_model().counter_fields,
+)
+
+
+class TokenCache:
+    """Токены вместе с пользователями.
+
+    Первый уровень — ограниченный LRU процесса, второй — общий кэш
+    Django. Ключи содержат версию области token_scope(key), которую
+    сигналы меняют при удалении токена и сохранении пользователя, поэтому
+    отозванный токен перестаёт действовать сразу во всех процессах.
+    Неизвестные токены не кэшируются, а поля DEFERRED_USER_FIELDS
+    пользователя отложены.
+    """
+
+    max_size = 10000
+    local_timeout = 60
+    timeout = 60 * 60
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def _get_local(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            if entry[1] < monotonic():
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry[0]
+
+    def _set_local(self, cache_key, token):
+        with self._lock:
+            self._entries[cache_key] = (
+                token,
+                monotonic() + self.local_timeout,
+            )
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, model, key):
+        return (
+            model.objects.select_related('user')
+            .defer(*(f'user__{field}' for field in DEFERRED_USER_FIELDS))
+            .filter(key=key)
+            .first()
+        )
+
+    def get(self, model, key):
+        """Возвращает копию токена с пользователем или None."""
+        scope = token_scope(key)
+        created = find_version(scope) is None
+        # Версия читается до БД: если токен отзовут между этими
+        # запросами, он попадёт в кэш под уже устаревшей версией.
+        cache_key = CACHE_KEY.format(scope, get_version(scope))
+        token = (
+            None
+            if created
+            else self._get_local(cache_key) or cache.get(cache_key)
+        )
+        if token is None:
+            token = self._load(model, key)
+            if token is None:
+                if created:
+                    forget_version(scope)
+                return None
+            cache.set(cache_key, token, self.timeout)
+        self._set_local(cache_key, token)
+        token = copy(token)
+        token.user = copy(token.user)
+        return token
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для уже известных токенов."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(self.get_model(), key)
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
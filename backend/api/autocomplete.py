@@ -0,0 +1,50 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.cache_versions import get_version
+from recipes.models import Ingredient
+from recipes.signals import INGREDIENTS_SCOPE
+
+from .serializers import IngredientSerializer
+
+
+class IngredientIndex:
+    """Отсортированный по casefold-именам индекс продуктов процесса."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._state = (None, [], [])
+
+    def _build(self, version):
+        entries = sorted(
+            (
+                (item['name'].casefold(), item)
+                for item in IngredientSerializer(
+                    Ingredient.objects.all(), many=True
+                ).data
+            ),
+            key=lambda entry: entry[0],
+        )
+        return (
+            version,
+            [key for key, _ in entries],
+            [item for _, item in entries],
+        )
+
+    def _get_state(self):
+        version = get_version(INGREDIENTS_SCOPE)
+        if self._state[0] != version:
+            with self._lock:
+                if self._state[0] != version:
+                    self._state = self._build(version)
+        return self._state
+
+    def search(self, prefix):
+        _, keys, items = self._get_state()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), lo=start)
+        return items[start:end]
+
+
+ingredient_index = IngredientIndex()
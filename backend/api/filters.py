@@ -1,15 +1,11 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet
 from django_filters.rest_framework.filters import (
     BooleanFilter,
     ModelMultipleChoiceFilter,
 )
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag
-
-
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
 
 
 class RecipeFilterSet(FilterSet):
@@ -17,6 +13,7 @@ class RecipeFilterSet(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='get_tags',
     )
     is_favorited = BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = BooleanFilter(method='get_is_in_shopping_cart')
@@ -25,12 +22,30 @@ class RecipeFilterSet(FilterSet):
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
 
-    def get_is_favorited(self, recipes, name, value):
+    def get_tags(self, recipes, name, tags):
+        if not tags:
+            return recipes
+        return recipes.filter(
+            Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__in=tags
+                )
+            )
+        )
+
+    def _filter_by_user(self, recipes, model, value):
         if self.request.user.is_authenticated and value:
-            return recipes.filter(favorites__user=self.request.user)
+            return recipes.filter(
+                Exists(
+                    model.objects.filter(
+                        user=self.request.user, recipe=OuterRef('pk')
+                    )
+                )
+            )
         return recipes
 
+    def get_is_favorited(self, recipes, name, value):
+        return self._filter_by_user(recipes, Favorite, value)
+
     def get_is_in_shopping_cart(self, recipes, name, value):
-        if self.request.user.is_authenticated and value:
-            return recipes.filter(shoppingcarts__user=self.request.user)
-        return recipes
+        return self._filter_by_user(recipes, ShoppingCart, value)
@@ -1,6 +1,113 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from recipes.paginator import EstimatedCountPaginator
+
+POSITION_SEPARATOR = '|'
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничный вывод с оценкой общего числа объектов.
+
+    count_is_exact в ответе показывает, посчитан ли count точно.
+    """
+
+    page_size_query_param = 'limit'
+    max_page_size = 6
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                (
+                    ('count', self.page.paginator.count),
+                    ('count_is_exact', self.page.paginator.count_is_exact),
+                    ('next', self.get_next_link()),
+                    ('previous', self.get_previous_link()),
+                    ('results', data),
+                )
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {
+            'type': 'boolean',
+            'example': True,
+        }
+        return response_schema
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсор по всем полям сортировки.
+
+    CursorPagination DRF хранит в курсоре только первое поле и при
+    одинаковых датах публикации переходит на OFFSET. Здесь позиция
+    состоит из значений всех полей, поэтому она уникальна, а страница
+    выбирается условием по индексу без смещения.
+    """
+
+    ordering = ('-pub_date', '-id')
     page_size_query_param = 'limit'
     max_page_size = 6
+
+    def decode_cursor(self, request):
+        # Позицию применяет paginate_queryset: DRF сравнил бы с ней
+        # только первое поле.
+        cursor = super().decode_cursor(request)
+        return cursor and cursor._replace(position=None)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = super().decode_cursor(request)
+        position = cursor and cursor.position
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(
+                    queryset.model, position, cursor.reverse
+                )
+            )
+        page = super().paginate_queryset(queryset, request, view)
+        if position is not None:
+            if cursor.reverse:
+                self.has_next, self.next_position = True, position
+            else:
+                self.has_previous, self.previous_position = True, position
+        return page
+
+    def get_position_filter(self, model, position, reverse):
+        names = [order.lstrip('-') for order in self.ordering]
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(names):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'lt' if reverse != self.ordering[0].startswith('-') else 'gt'
+        condition = Q(**{f'{names[-1]}__{lookup}': values[-1]})
+        for name, value in zip(names[-2::-1], values[-2::-1]):
+            condition = Q(**{f'{name}__{lookup}': value}) | (
+                Q(**{name: value}) & condition
+            )
+        # Нестрогое условие по первому полю ограничивает просмотр индекса.
+        return Q(**{f'{names[0]}__{lookup}e': values[0]}) & condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            str(instance.serializable_value(order.lstrip('-')))
+            for order in ordering
+        )
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Страница ленты читается одним проходом по индексу записей ленты."""
+
+    ordering = ('-pub_date', '-recipe')
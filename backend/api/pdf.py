@@ -0,0 +1,129 @@
+from textwrap import wrap
+
+
+ENCODING = 'cp1251'
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+LINE_WIDTH = 90
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+CATALOG, PAGES, FONT, FONT_ENCODING = 1, 2, 3, 4
+
+
+CYRILLIC = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+
+
+def _glyph_name(char):
+    if char == '№':
+        return 'afii61352'
+    if char in CYRILLIC:
+        return f'afii{10017 + CYRILLIC.index(char)}'
+    return f'afii{10065 + CYRILLIC.index(char.upper())}'
+
+
+def _glyph_differences():
+    codes = (0xA8, 0xB8, 0xB9, *range(0xC0, 0x100))
+    return ' '.join(
+        f'{code} /{_glyph_name(bytes((code,)).decode(ENCODING))}'
+        for code in codes
+    )
+
+
+def _escape(line):
+    return (
+        line.encode(ENCODING, errors='replace')
+        .replace(b'\\', b'\\\\')
+        .replace(b'(', b'\\(')
+        .replace(b')', b'\\)')
+    )
+
+
+class StreamingPDFWriter:
+    """Постранично отдаёт PDF-документ со строками текста.
+
+    Кириллица кодируется в cp1251 и отображается на глифы шрифта через
+    /Differences со стандартными именами Adobe, поэтому документ не требует
+    встроенного шрифта.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.page_numbers = []
+
+    def _write(self, chunk):
+        self.offset += len(chunk)
+        return chunk
+
+    def _object(self, number, body):
+        if isinstance(body, str):
+            body = body.encode()
+        self.offsets[number] = self.offset
+        return self._write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+
+    def _page(self, lines):
+        content_number = max(self.offsets) + 1
+        page_number = content_number + 1
+        self.page_numbers.append(page_number)
+        content = b'BT /F1 %d Tf %d TL %d %d Td\n%s\nET' % (
+            FONT_SIZE,
+            LEADING,
+            MARGIN,
+            PAGE_HEIGHT - MARGIN,
+            b'\n'.join(b"(%s) '" % _escape(line) for line in lines),
+        )
+        return self._object(
+            content_number,
+            b'<< /Length %d >>\nstream\n%s\nendstream'
+            % (len(content), content),
+        ) + self._object(
+            page_number,
+            f'<< /Type /Page /Parent {PAGES} 0 R '
+            f'/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 {FONT} 0 R >> >> '
+            f'/Contents {content_number} 0 R >>',
+        )
+
+    def render(self, lines):
+        yield self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self._object(
+            CATALOG, f'<< /Type /Catalog /Pages {PAGES} 0 R >>'
+        )
+        yield self._object(
+            FONT,
+            '<< /Type /Font /Subtype /TrueType /BaseFont /Arial '
+            f'/Encoding {FONT_ENCODING} 0 R >>',
+        )
+        yield self._object(
+            FONT_ENCODING,
+            '<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            f'/Differences [{_glyph_differences()}] >>',
+        )
+        page = []
+        for line in lines:
+            for part in wrap(line, LINE_WIDTH) or ('',):
+                page.append(part)
+                if len(page) == LINES_PER_PAGE:
+                    yield self._page(page)
+                    page = []
+        if page or not self.page_numbers:
+            yield self._page(page)
+        kids = ' '.join(f'{number} 0 R' for number in self.page_numbers)
+        yield self._object(
+            PAGES,
+            f'<< /Type /Pages /Kids [{kids}] '
+            f'/Count {len(self.page_numbers)} >>',
+        )
+        xref_offset = self.offset
+        size = max(self.offsets) + 1
+        yield (
+            f'xref\n0 {size}\n0000000000 65535 f \n'
+            + ''.join(
+                f'{self.offsets[number]:010d} 00000 n \n'
+                for number in range(1, size)
+            )
+            + f'trailer\n<< /Size {size} /Root {CATALOG} 0 R >>\n'
+            f'startxref\n{xref_offset}\n%%EOF\n'
+        ).encode()
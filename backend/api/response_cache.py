@@ -0,0 +1,91 @@
+from hashlib import sha256
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from db.routers import primary
+from recipes.cache_versions import (
+    ALL_RECIPES_SCOPE,
+    author_scope,
+    get_versions,
+    recipe_scope,
+    tag_scope,
+)
+from recipes.signals import INGREDIENTS_SCOPE, TAGS_SCOPE
+
+
+CACHE_KEY = 'responses:{}'
+CACHED_PARAMS = ('author', 'cursor', 'limit', 'page', 'pagination', 'tags')
+
+
+class AnonymousResponseCache:
+    """Кэш ответов на GET-запросы анонимных пользователей.
+
+    Ключ строится из нормализованных параметров и версий областей кэша,
+    поэтому при изменении данных устаревают только затронутые записи.
+    Области получают те же идентификаторы, что и в сигналах; если
+    параметры к ним не приводятся (scopes равно None), ответ
+    не кэшируется.
+    """
+
+    timeout = 60 * 60
+
+    def _get_key(self, request, scopes):
+        params = tuple(
+            (name, tuple(sorted(request.GET.getlist(name))))
+            for name in CACHED_PARAMS
+            if name in request.GET
+        )
+        versions = get_versions(*scopes, TAGS_SCOPE, INGREDIENTS_SCOPE)
+        return CACHE_KEY.format(
+            sha256(
+                repr(
+                    (
+                        request.build_absolute_uri(request.path),
+                        params,
+                        sorted(versions.items()),
+                    )
+                ).encode()
+            ).hexdigest()
+        )
+
+    def get(self, request, scopes):
+        if scopes is None:
+            return None
+        return cache.get(self._get_key(request, scopes))
+
+    def respond(self, request, scopes, get_response):
+        if (
+            scopes is None
+            or request.user.is_authenticated
+            or request.method != 'GET'
+        ):
+            return get_response()
+        key = self._get_key(request, scopes)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        # Отстающая реплика попала бы в кэш на всё время жизни записи.
+        with primary():
+            response = get_response()
+        if response.status_code == 200:
+            cache.set(key, response.data, self.timeout)
+        return response
+
+    def list_scopes(self, request):
+        scopes = {tag_scope(slug) for slug in request.GET.getlist('tags')}
+        if 'author' in request.GET:
+            try:
+                scopes.add(author_scope(int(request.GET['author'])))
+            except ValueError:
+                return None
+        return scopes or {ALL_RECIPES_SCOPE}
+
+    def detail_scopes(self, pk):
+        try:
+            return {recipe_scope(int(pk))}
+        except ValueError:
+            return None
+
+
+recipe_response_cache = AnonymousResponseCache()
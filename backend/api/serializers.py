@@ -1,8 +1,11 @@
 from collections import Counter
 
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.core.validators import MinValueValidator
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
@@ -15,22 +18,109 @@ from recipes.models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingCartIngredient,
     Subscription,
     Tag,
 )
 
+from .utils import get_recipes_limit
+
 
 User = get_user_model()
 
 
+class PrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при записи проверяет только тип.
+
+    Возвращает сам первичный ключ: объекты загружает одним запросом
+    RelatedListField.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class RelatedListField(serializers.ListField):
+    """ListField, загружающий связанные объекты всех элементов разом.
+
+    Дочернее поле (или поле key дочернего сериализатора) — PrimaryKeyField.
+    После проверки элементов объекты выбираются одним запросом in_bulk,
+    а отсутствующие ключи попадают в ошибки вместе с остальными.
+    """
+
+    def __init__(self, *args, key=None, **kwargs):
+        self.key = key
+        super().__init__(*args, **kwargs)
+
+    def run_child_validation(self, data):
+        related_field = (
+            self.child if self.key is None else self.child.fields[self.key]
+        )
+        source = None if self.key is None else related_field.source
+        values, errors = {}, {}
+        for index, item in enumerate(data):
+            try:
+                values[index] = self.child.run_validation(item)
+            except serializers.ValidationError as error:
+                errors[index] = error.detail
+        primary_keys = {
+            index: value if source is None else value[source]
+            for index, value in values.items()
+        }
+        objects = related_field.get_queryset().in_bulk(
+            set(primary_keys.values())
+        )
+        message = related_field.error_messages['does_not_exist']
+        for index, primary_key in primary_keys.items():
+            if primary_key not in objects:
+                error = [message.format(pk_value=primary_key)]
+                errors[index] = error if source is None else {self.key: error}
+            elif source is None:
+                values[index] = objects[primary_key]
+            else:
+                values[index][source] = objects[primary_key]
+        if errors:
+            raise serializers.ValidationError(dict(sorted(errors.items())))
+        return list(values.values())
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    def to_representation(self, thumbnails):
+        request = self.context.get('request')
+        return {
+            size: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(name))
+                    if request
+                    else default_storage.url(name)
+                )
+                for extension, name in formats.items()
+            }
+            for size, formats in thumbnails.get('sizes', {}).items()
+        }
+
+
 class UserSerializer(DjoserUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
+    avatar_thumbnails = ThumbnailsField()
 
     class Meta:
         model = User
-        fields = (*DjoserUserSerializer.Meta.fields, 'avatar', 'is_subscribed')
+        fields = (
+            *DjoserUserSerializer.Meta.fields,
+            'avatar',
+            'avatar_thumbnails',
+            'is_subscribed',
+        )
 
     def get_is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -61,7 +151,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = PrimaryKeyField(
         queryset=Ingredient.objects.all(), source='ingredient'
     )
     name = serializers.ReadOnlyField(source='ingredient.name')
@@ -87,6 +177,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source='recipeingredients', many=True
     )
+    image_thumbnails = ThumbnailsField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
 
@@ -99,14 +190,23 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_thumbnails',
             'text',
             'cooking_time',
             'is_in_shopping_cart',
             'is_favorited',
+            'favorites_count',
         )
         read_only_fields = fields
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, 'is_author_subscribed'):
+            recipe.author.is_subscribed = recipe.is_author_subscribed
+        return super().to_representation(recipe)
+
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -114,6 +214,8 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context.get('request').user
         return (
             user.is_authenticated
@@ -122,15 +224,14 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
 
 
 class WriteRecipeSerializer(serializers.ModelSerializer):
-    ingredients = serializers.ListField(
+    ingredients = RelatedListField(
         child=RecipeIngredientSerializer(),
+        key='id',
         allow_empty=False,
         required=True,
     )
-    tags = serializers.ListField(
-        child=serializers.PrimaryKeyRelatedField(
-            queryset=Tag.objects.all(),
-        ),
+    tags = RelatedListField(
+        child=PrimaryKeyField(queryset=Tag.objects.all()),
         allow_empty=False,
         required=True,
     )
@@ -190,21 +291,69 @@ class WriteRecipeSerializer(serializers.ModelSerializer):
         self._save_ingredients(recipe, ingredients_data)
         return recipe
 
+    @staticmethod
+    def _update_ingredients(recipe, ingredients):
+        """Приводит продукты рецепта к новому списку.
+
+        Удаляются только убранные продукты, количество обновляется только
+        у изменившихся, вставляются только новые. Запросов столько же при
+        любом числе продуктов: все изменения идут без сигналов, а их
+        разница по продуктам возвращается для корзин покупок.
+        """
+        old_items = {
+            item.ingredient_id: item
+            for item in recipe.recipeingredients.all()
+        }
+        new_amounts = {
+            item['ingredient'].id: item['amount'] for item in ingredients
+        }
+        deltas, removed, changed = {}, [], []
+        for ingredient_id, item in old_items.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is None:
+                deltas[ingredient_id] = -item.amount
+                removed.append(item.id)
+            elif amount != item.amount:
+                deltas[ingredient_id] = amount - item.amount
+                item.amount = amount
+                changed.append(item)
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in old_items
+        ]
+        deltas.update((item.ingredient_id, item.amount) for item in added)
+        if removed:
+            # delete() вызвал бы post_delete и пересчёт корзин по строке.
+            removed = RecipeIngredient.objects.filter(pk__in=removed)
+            removed._raw_delete(removed.db)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        return deltas
+
     @transaction.atomic
     def update(self, recipe, validated_data):
-        try:
-            new_ingredients = validated_data.pop('ingredients')
-            recipe.ingredients.clear()
-            self._save_ingredients(recipe, new_ingredients)
-        except KeyError:
-            pass
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            ShoppingCartIngredient.apply_deltas(
+                recipe.shoppingcarts.values_list('user_id', flat=True),
+                self._update_ingredients(recipe, ingredients),
+            )
         return super().update(recipe, validated_data)
 
     def to_representation(self, recipe):
+        prefetch_related_objects(
+            (recipe,), 'tags', 'recipeingredients__ingredient'
+        )
         return ReadRecipeSerializer(recipe, context=self.context).data
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image_thumbnails = ThumbnailsField()
 
     class Meta:
         model = Recipe
@@ -212,26 +361,26 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_thumbnails',
             'cooking_time',
         )
 
 
 class ReadSubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
 
     class Meta(UserSerializer.Meta):
         fields = (*UserSerializer.Meta.fields, 'recipes', 'recipes_count')
 
     def get_recipes(self, user):
+        if hasattr(user, 'limited_recipes'):
+            recipes = user.limited_recipes
+        else:
+            recipes = user.recipes.all()[
+                : get_recipes_limit(self.context.get('request'))
+            ]
         return ShortRecipeSerializer(
-            user.recipes.all()[
-                : int(
-                    self.context.get('request').GET.get(
-                        'recipes_limit', 10**10
-                    )
-                )
-            ],
+            recipes,
             context=self.context,
             many=True,
         ).data
@@ -0,0 +1,86 @@
+import gzip
+from hashlib import sha256
+from threading import Lock
+
+import brotli
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from recipes.cache_versions import get_version
+from recipes.models import Ingredient, Tag
+from recipes.signals import INGREDIENTS_SCOPE, TAGS_SCOPE
+
+from .serializers import IngredientSerializer, TagSerializer
+
+
+ENCODINGS = ('br', 'gzip')
+
+
+class ReferenceSnapshot:
+    """Сериализованный и сжатый список справочника для текущей версии."""
+
+    def __init__(self, scope, queryset, serializer_class):
+        self.scope = scope
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._lock = Lock()
+        self._snapshot = {'version': None}
+
+    def _build(self, version):
+        body = JSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data
+        )
+        return {
+            'version': version,
+            'digest': sha256(body).hexdigest()[:32],
+            None: body,
+            'br': brotli.compress(body),
+            'gzip': gzip.compress(body, mtime=0),
+        }
+
+    def get(self):
+        version = get_version(self.scope)
+        if self._snapshot['version'] != version:
+            with self._lock:
+                if self._snapshot['version'] != version:
+                    self._snapshot = self._build(version)
+        return self._snapshot
+
+    def response(self, request):
+        return self.render(request, self.get())
+
+    def render(self, request, snapshot):
+        accepted = {
+            item.split(';')[0].strip()
+            for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        }
+        encoding = next((name for name in ENCODINGS if name in accepted), None)
+        # У каждого сжатого представления свой сильный ETag, иначе кэш
+        # ответит на If-None-Match телом в чужой кодировке.
+        etag = (
+            f'"{snapshot["digest"]}-{encoding}"'
+            if encoding
+            else f'"{snapshot["digest"]}"'
+        )
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if '*' in etags or etag in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                snapshot[encoding], content_type='application/json'
+            )
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+tags_snapshot = ReferenceSnapshot(
+    TAGS_SCOPE, Tag.objects.all(), TagSerializer
+)
+ingredients_snapshot = ReferenceSnapshot(
+    INGREDIENTS_SCOPE, Ingredient.objects.all(), IngredientSerializer
+)
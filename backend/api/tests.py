@@ -0,0 +1,415 @@
+from itertools import combinations
+from unittest import mock
+
+from django.db import connection
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import include, path
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend import urls as backend_urls
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+    Tag,
+    User,
+)
+from recipes.views import recipe_shared_link_async
+
+from .authentication import TokenCache, token_cache
+from .filters import RecipeFilterSet
+from .urls import async_urlpatterns
+
+
+FILTERS = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+
+# Адреса с async-представлениями, как при ASYNC_VIEWS = True.
+urlpatterns = [
+    path('api/', include(async_urlpatterns)),
+    path('s/<slug>/', recipe_shared_link_async, name='short_url'),
+    *backend_urls.urlpatterns,
+]
+
+
+class RecipeFilterPlanTests(TestCase):
+    """Фильтры рецептов не размножают строки и читают таблицы по индексам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other, cls.reader = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'other', 'reader')
+        )
+        cls.tags = [
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ('breakfast', 'lunch', 'dinner')
+        ]
+        cls.recipes = []
+        for number, (author, tags) in enumerate(
+            (
+                (cls.author, cls.tags[:2]),
+                (cls.author, cls.tags),
+                (cls.author, cls.tags[2:]),
+                (cls.other, cls.tags[:2]),
+            )
+        ):
+            recipe = Recipe.objects.create(
+                name=f'recipe {number}',
+                author=author,
+                image=f'recipes/images/{number}.png',
+                text='text',
+                cooking_time=1,
+            )
+            recipe.tags.set(tags)
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[:2] + cls.recipes[3:]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+        for recipe in cls.recipes[1:]:
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+
+    def params(self, names):
+        values = {
+            'tags': [tag.slug for tag in self.tags[:2]],
+            'author': self.author.id,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+        }
+        return {name: values[name] for name in names}
+
+    def expected(self, names):
+        tags = set(self.tags[:2])
+        return {
+            recipe.id
+            for recipe in self.recipes
+            if ('tags' not in names or tags & set(recipe.tags.all()))
+            and ('author' not in names or recipe.author == self.author)
+            and (
+                'is_favorited' not in names
+                or recipe.favorites.filter(user=self.reader).exists()
+            )
+            and (
+                'is_in_shopping_cart' not in names
+                or recipe.shoppingcarts.filter(user=self.reader).exists()
+            )
+        }
+
+    def queryset(self, names):
+        request = RequestFactory().get('/api/recipes/')
+        request.user = self.reader
+        filterset = RecipeFilterSet(
+            self.params(names),
+            queryset=Recipe.objects.with_user_flags(self.reader),
+            request=request,
+        )
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs
+
+    def explain(self, queryset):
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        # На маленьких таблицах планировщик предпочтёт полный просмотр;
+        # без него видно, покрыт ли индексами каждый доступ к таблице.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_filter_combinations(self):
+        for size in range(len(FILTERS) + 1):
+            for names in combinations(FILTERS, size):
+                with self.subTest(filters=names):
+                    queryset = self.queryset(names)
+                    ids = list(queryset.values_list('id', flat=True))
+                    self.assertEqual(len(ids), len(set(ids)))
+                    self.assertEqual(set(ids), self.expected(names))
+                    self.assertNotIn('DISTINCT', str(queryset.query))
+                    plan = self.explain(queryset)
+                    self.assertNotIn('DISTINCT', plan)
+                    if connection.vendor == 'postgresql':
+                        self.assertNotIn('Seq Scan', plan)
+                    else:
+                        for line in plan.splitlines():
+                            if ' SCAN ' in line:
+                                self.assertIn('INDEX', line)
+                    if connection.vendor != 'postgresql' or set(names) <= {
+                        'author'
+                    }:
+                        self.assertIn(
+                            'recipe_author_date_idx'
+                            if 'author' in names
+                            else 'recipe_date_idx',
+                            plan,
+                        )
+
+
+class TokenCacheTests(TestCase):
+    """Отозванный токен перестаёт действовать и при прогретом кэше."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.org',
+            password='old-password',
+            first_name='reader',
+            last_name='reader',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_cached_token_skips_database(self):
+        with self.assertNumQueries(0):
+            token = token_cache.get(Token, self.token.key)
+        self.assertEqual(token.user, self.user)
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_password_change(self):
+        response = self.client.post(
+            '/api/users/set_password/',
+            {
+                'current_password': 'old-password',
+                'new_password': 'new-Password-2',
+            },
+        )
+        self.assertEqual(response.status_code, 204)
+        user = token_cache.get(Token, self.token.key).user
+        self.assertTrue(user.check_password('new-Password-2'))
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_revoked_while_loading(self):
+        other = Token.objects.create(
+            user=User.objects.create_user(
+                username='other',
+                email='other@example.org',
+                password='password',
+                first_name='other',
+                last_name='other',
+            )
+        )
+        load = TokenCache._load
+
+        def load_and_revoke(cache, model, key):
+            token = load(cache, model, key)
+            Token.objects.filter(key=key).delete()
+            return token
+
+        with mock.patch.object(TokenCache, '_load', load_and_revoke):
+            self.assertIsNotNone(token_cache.get(Token, other.key))
+        self.assertIsNone(token_cache.get(Token, other.key))
+
+
+class RecipeIngredientsUpdateTests(TestCase):
+    """Изменение продуктов рецепта не зависит по запросам от их числа."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, *cls.readers = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'first', 'second', 'third')
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient {number}', measurement_unit='g'
+            )
+            for number in range(32)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            name='recipe',
+            author=self.author,
+            image='recipes/images/recipe.png',
+            text='text',
+            cooking_time=1,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in self.ingredients
+        )
+        for reader in self.readers:
+            ShoppingCart.objects.create(user=reader, recipe=recipe)
+        return recipe
+
+    def update(self, kept):
+        """Оставляет в новом рецепте kept продуктов из 32."""
+        recipe = self.create_recipe()
+        data = {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 20}
+                for ingredient in self.ingredients[:kept]
+            ]
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        for reader in self.readers:
+            self.assertEqual(
+                dict(
+                    ShoppingCartIngredient.objects.filter(
+                        user=reader
+                    ).values_list('ingredient_id', 'amount')
+                ),
+                {ingredient.id: 20 for ingredient in self.ingredients[:kept]},
+            )
+            ShoppingCart.objects.filter(user=reader).delete()
+        return len(queries)
+
+    def test_removed_ingredients_cost_no_extra_queries(self):
+        self.assertEqual(self.update(30), self.update(2))
+
+
+@override_settings(FEED_FANOUT_WORKERS=0)
+class FeedEndpointTests(TestCase):
+    """Лента подписок отдаёт новые рецепты авторов по курсору."""
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.other, self.reader = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'other', 'reader')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def publish(self, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                name='recipe',
+                author=author,
+                image='',
+                text='text',
+                cooking_time=1,
+            ).id
+
+    def test_anonymous(self):
+        self.assertEqual(
+            APIClient().get('/api/recipes/feed/').status_code, 401
+        )
+
+    def test_feed(self):
+        backfilled = self.publish(self.author)
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        self.publish(self.other)
+        published = [self.publish(self.author) for _ in range(2)]
+        ids, url = [], '/api/recipes/feed/?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, [*reversed(published), backfilled])
+
+
+class AsyncViewsParityTests(TestCase):
+    """Async-представления отвечают так же, как представления DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author',
+            email='author@example.org',
+            password='password',
+            first_name='author',
+            last_name='author',
+        )
+        cls.token = Token.objects.create(user=cls.author)
+        tag = Tag.objects.create(name='lunch', slug='lunch')
+        salt = Ingredient.objects.create(name='salt', measurement_unit='g')
+        Ingredient.objects.create(name='sugar', measurement_unit='g')
+        cls.recipe = Recipe.objects.create(
+            name='recipe',
+            author=cls.author,
+            image='',
+            text='text',
+            cooking_time=1,
+        )
+        cls.recipe.tags.set((tag,))
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=salt, amount=1
+        )
+        Favorite.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        return (
+            response.status_code,
+            response.content,
+            sorted(response.items()),
+        )
+
+    def assertSameResponses(self, url, **headers):
+        cache.clear()
+        expected = self.get(url, **headers)
+        with override_settings(ROOT_URLCONF=__name__):
+            cache.clear()
+            self.assertEqual(self.get(url, **headers), expected, 'miss')
+            self.assertEqual(self.get(url, **headers), expected, 'hit')
+
+    def test_parity(self):
+        token = {'HTTP_AUTHORIZATION': f'Token {self.token}'}
+        for url, headers in (
+            ('/api/tags/', {}),
+            ('/api/tags/', {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+            ('/api/tags/', token),
+            ('/api/ingredients/', {'HTTP_ACCEPT_ENCODING': 'br'}),
+            ('/api/ingredients/?name=sa', {}),
+            ('/api/ingredients/?name=sa', token),
+            ('/api/recipes/', {}),
+            ('/api/recipes/', token),
+            ('/api/recipes/?tags=lunch&limit=1', {}),
+            ('/api/recipes/?author=author', {}),
+            ('/api/recipes/?pagination=cursor', {}),
+            (f'/api/recipes/{self.recipe.id}/', {}),
+            (f'/api/recipes/{self.recipe.id}/', token),
+            ('/api/recipes/0/', {}),
+            ('/api/recipes/', {'HTTP_AUTHORIZATION': 'Token wrong'}),
+            (f'/s/{self.recipe.short_url_code}/', {}),
+            ('/s/missing/', {}),
+        ):
+            with self.subTest(url=url, headers=headers):
+                self.assertSameResponses(url, **headers)
+
+    def test_not_modified(self):
+        for url in ('/api/tags/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertSameResponses(url, HTTP_IF_NONE_MATCH=etag)
@@ -1,29 +1,98 @@
+import csv
+
+from django.conf import settings
 from django.utils import timezone
 
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+
+from .pdf import StreamingPDFWriter
+
 
 TIME_FORMAT = '%d-%m-%Y %H:%M'
+CHUNK_SIZE = 2000
+INGREDIENT, RECIPE = 'ingredient', 'recipe'
+
+
+def get_recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return settings.MAX_RECIPES_LIMIT
+    return max(0, min(limit, settings.MAX_RECIPES_LIMIT))
 
 
-def make_shopping_cart_file(ingredients, recipes):
-    current_time = timezone.now().strftime(TIME_FORMAT)
-    ingredients = [
-        f'{index}. {item["ingredient__name"].capitalize()} '
-        f'({item["ingredient__measurement_unit"]}) - '
-        f'{item["amount"]}'
-        for index, item in enumerate(ingredients, start=1)
-    ]
-    recipes = [
-        f'{index}. {recipe.name}'
-        for index, recipe in enumerate(recipes, start=1)
-    ]
-    return '\n'.join(
-        [
-            f'Дата и время: {current_time}',
-            '',
-            'Список покупок:',
-            *ingredients,
-            '',
-            'Список рецептов:',
-            *recipes,
-        ]
+def shopping_cart_items(user):
+    """Читает готовые суммы продуктов корзины и её рецепты."""
+    totals = (
+        ShoppingCartIngredient.objects.filter(user=user)
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
     )
+    for item in totals:
+        yield INGREDIENT, item
+    recipes = (
+        ShoppingCart.objects.filter(user=user)
+        .order_by('recipe__name')
+        .values_list('recipe__name', flat=True)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for recipe_name in recipes:
+        yield RECIPE, recipe_name
+
+
+def shopping_cart_lines(items):
+    yield f'Дата и время: {timezone.now().strftime(TIME_FORMAT)}'
+    yield ''
+    yield 'Список покупок:'
+    index = 0
+    section = INGREDIENT
+    for kind, item in items:
+        if kind != section:
+            section, index = kind, 0
+            yield ''
+            yield 'Список рецептов:'
+        index += 1
+        if kind == INGREDIENT:
+            name, unit, amount = item
+            yield f'{index}. {name.capitalize()} ({unit}) - {amount}'
+        else:
+            yield f'{index}. {item}'
+    if section == INGREDIENT:
+        yield ''
+        yield 'Список рецептов:'
+
+
+def make_shopping_cart_txt(items):
+    lines = shopping_cart_lines(items)
+    yield next(lines)
+    for line in lines:
+        yield f'\n{line}'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def make_shopping_cart_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('type', 'name', 'measurement_unit', 'amount'))
+    for kind, item in items:
+        if kind == INGREDIENT:
+            yield writer.writerow((kind, *item))
+        else:
+            yield writer.writerow((kind, item, '', ''))
+
+
+def make_shopping_cart_pdf(items):
+    return StreamingPDFWriter().render(shopping_cart_lines(items))
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': make_shopping_cart_txt,
+    'csv': make_shopping_cart_csv,
+    'pdf': make_shopping_cart_pdf,
+}
@@ -1,8 +1,15 @@
+from functools import partial
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import (
+    Exists,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
@@ -13,24 +20,48 @@ from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
+from recipes import feeds
 from recipes.models import (
     Error,
     Favorite,
+    FeedEntry,
     Ingredient,
     Recipe,
-    RecipeIngredient,
     ShoppingCart,
     Subscription,
     Tag,
 )
 
-from . import filters, pagination, permissions, serializers, utils
+from . import (
+    filters,
+    pagination,
+    permissions,
+    renderers,
+    serializers,
+    utils,
+)
+from .autocomplete import ingredient_index
+from .response_cache import recipe_response_cache
+from .snapshots import ingredients_snapshot, tags_snapshot
 
 
 User = get_user_model()
 
 
 class UserViewSet(DjoserUserViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(is_subscribed=Value(False))
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(
+                    subscriber=user, author=OuterRef('pk')
+                )
+            )
+        )
+
     def get_permissions(self):
         if self.action == 'me':
             return (IsAuthenticated(),)
@@ -47,7 +78,8 @@ class UserViewSet(DjoserUserViewSet):
     def avatar(self, request):
         user = request.user
         if request.method == 'DELETE':
-            user.avatar.delete(save=True)
+            user.avatar = None
+            user.save()
             return Response(status=HTTPStatus.NO_CONTENT)
         serializer = serializers.AvatarSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -64,7 +96,24 @@ class UserViewSet(DjoserUserViewSet):
         pagination_class=pagination.LimitPageNumberPagination,
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(authors__subscriber=request.user)
+        limited_recipes = Recipe.objects.filter(
+            pk__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author'))
+                .values('pk')[: utils.get_recipes_limit(request)]
+            )
+        )
+        queryset = (
+            User.objects.filter(authors__subscriber=request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by(*User._meta.ordering)
+            .prefetch_related(
+                Prefetch(
+                    'recipes',
+                    queryset=limited_recipes,
+                    to_attr='limited_recipes',
+                )
+            )
+        )
         serializer = serializers.ReadSubscriptionSerializer(
             self.paginate_queryset(queryset),
             many=True,
@@ -110,19 +159,28 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     permission_classes = (AllowAny,)
 
+    def list(self, request, *args, **kwargs):
+        return tags_snapshot.response(request)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
     pagination_class = None
-    filter_backends = (filters.IngredientFilter,)
-    search_fields = ('^name',)
     permission_classes = (AllowAny,)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '').strip()
+        if name:
+            return Response(ingredient_index.search(name))
+        return ingredients_snapshot.response(request)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = (
-        Recipe.objects.prefetch_related('tags', 'ingredients')
+        Recipe.objects.prefetch_related(
+            'tags', 'recipeingredients__ingredient'
+        )
         .select_related('author')
         .all()
     )
@@ -130,14 +188,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = filters.RecipeFilterSet
 
+    def get_queryset(self):
+        return super().get_queryset().with_user_flags(self.request.user)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if self.action == 'list' and (
+                params.get('pagination') == 'cursor'
+                or pagination.RecipeCursorPagination.cursor_query_param
+                in params
+            ):
+                self._paginator = pagination.RecipeCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return serializers.ReadRecipeSerializer
         return serializers.WriteRecipeSerializer
 
+    def list(self, request, *args, **kwargs):
+        return recipe_response_cache.respond(
+            request,
+            recipe_response_cache.list_scopes(request),
+            partial(super().list, request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_response_cache.respond(
+            request,
+            recipe_response_cache.detail_scopes(kwargs['pk']),
+            partial(super().retrieve, request, *args, **kwargs),
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=pagination.FeedCursorPagination,
+    )
+    def feed(self, request):
+        feeds.pull(request.user)
+        entries = self.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).prefetch_related(
+                Prefetch('recipe', queryset=self.get_queryset())
+            )
+        )
+        serializer = self.get_serializer(
+            [entry.recipe for entry in entries], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, url_path='get-link')
     def get_link(self, request, pk=None):
         short_url_code = get_object_or_404(Recipe, pk=pk).short_url_code
@@ -146,29 +252,32 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return Response({'short-link': short_url}, status=HTTPStatus.OK)
 
-    @action(detail=False)
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        content_negotiation_class=renderers.FileFormatNegotiation,
+        renderer_classes=(
+            renderers.TextRenderer,
+            renderers.CSVRenderer,
+            renderers.PDFRenderer,
+        ),
+    )
     def download_shopping_cart(self, request):
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcarts__user=request.user
-            )
-            .select_related('recipe', 'ingredient')
-            .values(
-                'ingredient__name',
-                'ingredient__measurement_unit',
-            )
-            .annotate(amount=Sum('amount'))
-            .order_by('ingredient__name')
-        )
-        recipes = Recipe.objects.filter(
-            shoppingcarts__user=request.user
-        ).distinct()
-        return FileResponse(
-            utils.make_shopping_cart_file(ingredients, recipes),
-            as_attachment=True,
-            filename='shopping_cart.txt',
-            content_type='text/plain',
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            utils.SHOPPING_CART_FORMATS[renderer.format](
+                utils.shopping_cart_items(request.user)
+            ),
+            content_type=(
+                f'{renderer.media_type}; charset={renderer.charset}'
+                if renderer.charset
+                else renderer.media_type
+            ),
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
         )
+        return response
 
     @staticmethod
     def _favorite_shopping_cart_logic(
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'db.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Async variants of the hot read endpoints; enable when serving through
+# ASGI (gunicorn -k uvicorn.workers.UvicornWorker backend.asgi).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -99,8 +105,67 @@ else:
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('POSTGRES_DB_HOST', 'db'),
             'PORT': os.getenv('POSTGRES_DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 0)),
         }
     }
+    # Connection pool per worker process. Closing a connection returns it
+    # to the pool, so keep POSTGRES_CONN_MAX_AGE at 0 with the pool enabled.
+    if os.getenv('POSTGRES_POOL', 'False') == 'True':
+        DATABASES['default'].update(
+            ENGINE='db.postgresql',
+            POOL={
+                'SIZE': int(os.getenv('POSTGRES_POOL_SIZE', 10)),
+                # Extra connections opened when the pool is exhausted.
+                'OVERFLOW': int(os.getenv('POSTGRES_POOL_OVERFLOW', 0)),
+                # Seconds to wait for a free connection before failing.
+                'TIMEOUT': float(os.getenv('POSTGRES_POOL_TIMEOUT', 5)),
+                'MAX_LIFETIME': float(
+                    os.getenv('POSTGRES_POOL_MAX_LIFETIME', 30 * 60)
+                ),
+                # Connections idle for longer are checked with SELECT 1.
+                'HEALTH_CHECK_INTERVAL': float(
+                    os.getenv('POSTGRES_POOL_HEALTH_CHECK_INTERVAL', 30)
+                ),
+            },
+        )
+# Read replicas: comma-separated hosts (host or host:port) for PostgreSQL,
+# database files for SQLite. Safe requests read from a random replica.
+READ_REPLICAS = []
+for number, location in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1
+):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if replica['ENGINE'] == 'django.db.backends.sqlite3':
+        replica['NAME'] = BASE_DIR / location.strip()
+    else:
+        host, _, port = location.strip().partition(':')
+        replica['HOST'] = host
+        replica['PORT'] = port or replica['PORT']
+    DATABASES[f'replica{number}'] = replica
+    READ_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['db.routers.ReplicaRouter'] if READ_REPLICAS else []
+# After a write the client reads from the primary for this many seconds.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 15))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Token revocation, cache versions and replica pinning reach the other
+# workers and management commands only through a shared cache.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+if not DEBUG and CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+    raise ImproperlyConfigured(
+        'CACHE_BACKEND must be a cache shared between processes '
+        '(e.g. memcached) when DEBUG is off'
+    )
 
 
 # Password validation
@@ -156,7 +221,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
@@ -196,6 +261,33 @@ FORBIDDEN_USERNAMES = ('me',)
 AVATARS_PATH = 'users/avatars'
 RECIPES_IMAGES_PATH = 'recipes/images/'
 
+THUMBNAIL_SIZES = (100, 300, 600)
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+MAX_RECIPES_LIMIT = int(os.getenv('MAX_RECIPES_LIMIT', 50))
+
+# Paginated lists longer than this are not counted exactly on each request:
+# unfiltered tables use planner statistics, other lists a cached count.
+EXACT_COUNT_THRESHOLD = int(os.getenv('EXACT_COUNT_THRESHOLD', 10000))
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 5 * 60))
+
+# Subscription feeds: new recipes are copied into subscribers' feeds by
+# FEED_FANOUT_WORKERS threads (0 - during the request) in batches.
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', 2))
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', 1000))
+# Recipes of authors with this many subscribers or recipes are not copied;
+# readers pull them into their feeds at most every FEED_PULL_INTERVAL seconds.
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 10000)
+)
+FEED_FANOUT_MAX_RECIPES = int(os.getenv('FEED_FANOUT_MAX_RECIPES', 5000))
+FEED_PULL_INTERVAL = int(os.getenv('FEED_PULL_INTERVAL', 60))
+# Latest recipes of an author added to the feed on subscription.
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 100))
+
+# Changing the key makes new short codes collide with the issued ones.
+SHORT_URL_CODE_KEY = os.getenv('SHORT_URL_CODE_KEY', 'foodgram-short-codes')
+
 # For HTTPS  https://stackoverflow.com/questions/62047354/build-absolute-uri-with-https-behind-reverse-proxy
 USE_X_FORWARDED_HOST = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
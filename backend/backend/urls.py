@@ -3,12 +3,20 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from recipes.views import recipe_shared_link
+from recipes.views import recipe_shared_link, recipe_shared_link_async
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<slug>/', recipe_shared_link, name='short_url'),
+    path(
+        's/<slug>/',
+        (
+            recipe_shared_link_async
+            if settings.ASYNC_VIEWS
+            else recipe_shared_link
+        ),
+        name='short_url',
+    ),
 ]
 
 if settings.DEBUG:
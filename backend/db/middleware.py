@@ -0,0 +1,83 @@
+import asyncio
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+from .routers import start_routing, stop_routing
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+PIN_COOKIE = 'primary_pin'
+PIN_CACHE_KEY = 'primary_pin:{}'
+
+
+class ReplicaPinningMiddleware:
+    """Направляет чтение безопасных запросов на реплики.
+
+    Клиент, сделавший запись, REPLICA_PIN_SECONDS секунд читает с
+    основной БД: браузер — по cookie, клиент с токеном — по записи
+    в кэше для его заголовка Authorization.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.process_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_routing()
+        return self.process_response(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.process_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_routing()
+        return self.process_response(request, response, state)
+
+    def get_pin_key(self, request):
+        authorization = request.headers.get('Authorization')
+        if not authorization:
+            return None
+        return PIN_CACHE_KEY.format(
+            sha256(authorization.encode()).hexdigest()
+        )
+
+    def is_pinned(self, request):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        key = self.get_pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def process_request(self, request):
+        return start_routing(
+            request.method in SAFE_METHODS and not self.is_pinned(request)
+        )
+
+    def process_response(self, request, response, state):
+        if request.method in SAFE_METHODS and not state.wrote:
+            return response
+        response.set_cookie(
+            PIN_COOKIE,
+            '1',
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+        key = self.get_pin_key(request)
+        if key is not None:
+            cache.set(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
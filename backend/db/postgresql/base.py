@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+POOL_OPTIONS = {
+    'SIZE': 'size',
+    'OVERFLOW': 'overflow',
+    'TIMEOUT': 'timeout',
+    'MAX_LIFETIME': 'max_lifetime',
+    'HEALTH_CHECK_INTERVAL': 'health_check_interval',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL, берущий соединения из пула процесса.
+
+    Пул настраивается ключом POOL в DATABASES, без него действуют
+    значения по умолчанию ConnectionPool. Закрытие соединения
+    возвращает его в пул, поэтому с CONN_MAX_AGE = 0 каждый запрос
+    получает готовое соединение вместо нового подключения.
+    """
+
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        return get_pool(
+            repr(sorted(conn_params.items())),
+            {
+                POOL_OPTIONS[name]: value
+                for name, value in self.settings_dict.get('POOL', {}).items()
+            },
+        )
+
+    def get_new_connection(self, conn_params):
+        self._pool = self.get_pool(conn_params)
+        connection = self._pool.get(
+            partial(super().get_new_connection, conn_params)
+        )
+        # super() задаёт isolation_level только новым соединениям.
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.put(self.connection)
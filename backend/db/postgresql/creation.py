@@ -0,0 +1,19 @@
+from django.db.backends.postgresql import creation
+
+from .pool import close_pools
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Закрывает соединения пула перед удалением и копированием тестовой БД.
+
+    PostgreSQL не удаляет базу и не копирует шаблон, пока к ним
+    подключены другие сеансы.
+    """
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
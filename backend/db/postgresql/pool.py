@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import deque
+from time import monotonic
+
+import psycopg2 as Database
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(Database.OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2, общий для потоков одного процесса.
+
+    Первым выдаётся соединение, возвращённое последним. Пока открыто
+    меньше size соединений, при нехватке открывается новое; сверх size
+    открывается до overflow временных соединений, которые закрываются
+    при возврате. Когда заняты и они, get() ждёт освобождения не дольше
+    timeout секунд и выбрасывает PoolTimeout.
+
+    Соединения старше max_lifetime секунд закрываются, а простоявшие
+    дольше health_check_interval секунд перед выдачей проверяются
+    запросом SELECT 1.
+    """
+
+    def __init__(
+        self,
+        size=10,
+        overflow=0,
+        timeout=5,
+        max_lifetime=None,
+        health_check_interval=0,
+    ):
+        self.size = size
+        self.overflow = overflow
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.pid = os.getpid()
+        self.opened = 0
+        self._idle = deque()
+        self._opened_at = {}
+        self._condition = threading.Condition()
+
+    def get(self, connect):
+        deadline = monotonic() + self.timeout
+        while True:
+            connection, released_at = self._checkout(deadline)
+            if connection is None:
+                return self._open(connect)
+            if self._is_usable(connection, released_at):
+                return connection
+            self._discard(connection)
+
+    def put(self, connection):
+        if (
+            connection.closed
+            or self.opened > self.size
+            or self._is_expired(connection)
+        ):
+            self._discard(connection)
+            return
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Database.Error:
+                self._discard(connection)
+                return
+        with self._condition:
+            self._idle.append((connection, monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Закрывает простаивающие соединения."""
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _checkout(self, deadline):
+        with self._condition:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self.opened < self.size + self.overflow:
+                    self.opened += 1
+                    return None, None
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(
+                        f'All {self.opened} pooled connections are busy, '
+                        f'waited {self.timeout} s'
+                    )
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except BaseException:
+            self._release_slot()
+            raise
+        self._opened_at[connection] = monotonic()
+        return connection
+
+    def _discard(self, connection):
+        self._opened_at.pop(connection, None)
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self.opened -= 1
+            self._condition.notify()
+
+    def _is_expired(self, connection):
+        return bool(self.max_lifetime) and (
+            monotonic() - self._opened_at.get(connection, 0)
+            > self.max_lifetime
+        )
+
+    def _is_usable(self, connection, released_at):
+        if connection.closed or self._is_expired(connection):
+            return False
+        if monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    """Пул процесса для параметров подключения key.
+
+    После fork унаследованный пул заменяется новым: его соединения
+    принадлежат родительскому процессу.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = ConnectionPool(**options)
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+    for pool in pools:
+        pool.close()
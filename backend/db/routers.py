@@ -0,0 +1,80 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Модели, которые читаются только с основной БД: токен, выданный
+# при входе, должен находиться сразу, без ожидания реплики.
+PRIMARY_MODELS = frozenset(('authtoken.token',))
+
+
+class RoutingState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+_routing = ContextVar('db_routing', default=None)
+
+
+def start_routing(use_replicas):
+    """Начинает маршрутизацию запроса; без неё всё читается с основной БД.
+
+    Состояние изменяется на месте, поэтому запись, сделанная в потоке
+    sync_to_async, видна и асинхронному коду запроса.
+    """
+    state = RoutingState(use_replicas)
+    _routing.set(state)
+    return state
+
+
+def stop_routing():
+    _routing.set(None)
+
+
+@contextmanager
+def primary():
+    """Читает с основной БД внутри блока."""
+    state = _routing.get()
+    if state is None or not state.use_replicas:
+        yield
+        return
+    state.use_replicas = False
+    try:
+        yield
+    finally:
+        state.use_replicas = not state.wrote
+
+
+class ReplicaRouter:
+    """Читает с реплик READ_REPLICAS, если это разрешил запрос.
+
+    После первой записи и внутри транзакций запрос читает с основной
+    БД, чтобы видеть свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (
+            state is None
+            or not state.use_replicas
+            or model._meta.label_lower in PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.use_replicas = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.READ_REPLICAS
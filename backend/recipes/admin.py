@@ -2,11 +2,12 @@ from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
-from django.db.models import Count
+from django.core.files.storage import default_storage
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from rest_framework.authtoken.models import TokenProxy
 
+from .counters import count_related
 from .models import (
     Favorite,
     Ingredient,
@@ -17,11 +18,20 @@ from .models import (
     Tag,
     User,
 )
+from .paginator import EstimatedCountPaginator
 
 
 admin.site.unregister(Group)
 admin.site.unregister(TokenProxy)
 
+ADMIN_THUMBNAIL_SIZE = '100'
+
+
+def thumbnail_url(image, thumbnails):
+    sizes = thumbnails.get('sizes', {})
+    name = sizes.get(ADMIN_THUMBNAIL_SIZE, {}).get('jpeg')
+    return default_storage.url(name) if name else image.url
+
 
 class HasRecipesFilter(admin.SimpleListFilter):
     title = 'С рецептами'
@@ -103,26 +113,8 @@ class UserAdmin(BaseUserAdmin):
     )
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('id',)
-
-    def get_queryset(self, request):
-        return (
-            super()
-            .get_queryset(request)
-            .prefetch_related('authors', 'subscribers', 'recipes')
-            .annotate(
-                subscribers_count=Count('authors', distinct=True),
-                subscriptions_count=Count('subscribers', distinct=True),
-                recipes_count=Count('recipes', distinct=True),
-            )
-        )
-
-    @admin.display(description='Подписчики')
-    def subscribers_count(self, user):
-        return user.subscribers_count
-
-    @admin.display(description='Подписки')
-    def subscriptions_count(self, user):
-        return user.subscriptions_count
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description='Рецепты')
     @mark_safe
@@ -140,8 +132,9 @@ class UserAdmin(BaseUserAdmin):
     def avatar_display(self, user):
         if not user.avatar:
             return '-'
+        url = thumbnail_url(user.avatar, user.avatar_thumbnails)
         return (
-            f"<img src='{user.avatar.url}' width='100' height='100' "
+            f"<img src='{url}' width='100' height='100' "
             "style='object-fit: cover;' />"
         )
 
@@ -149,6 +142,9 @@ class UserAdmin(BaseUserAdmin):
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('subscriber', 'author')
+    list_select_related = ('subscriber', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -158,7 +154,7 @@ class TagAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
         return queryset.annotate(
-            recipes_count=Count('recipes__tags', distinct=True)
+            recipes_count=count_related(Recipe.tags.through.objects, 'tag')
         )
 
     @admin.display(description='Рецепты')
@@ -177,11 +173,13 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit', 'recipes_count')
     list_filter = ('measurement_unit',)
     search_fields = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
         return queryset.annotate(
-            recipes_count=Count('recipeingredients__recipe', distinct=True)
+            recipes_count=count_related(RecipeIngredient.objects, 'ingredient')
         )
 
     @admin.display(description='Рецепты')
@@ -225,14 +223,14 @@ class RecipeForm(forms.ModelForm):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     form = RecipeForm
-    readonly_fields = ('count_in_favorite',)
+    readonly_fields = ('favorites_count', 'shopping_carts_count')
     list_display = (
         'name',
         'author',
         'image_display',
         'text',
         'cooking_time',
-        'count_in_favorite',
+        'favorites_count',
         'tags_list',
         'ingredients_list',
     )
@@ -242,29 +240,25 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     search_fields = ('name', 'tags__name', 'ingredients__name')
     inlines = (RecipeIngredientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return (
             super()
             .get_queryset(request)
             .select_related('author')
-            .prefetch_related(
-                'tags', 'ingredients', 'recipeingredients__ingredient'
-            )
-            .annotate(count_in_favorite=Count('favorites'))
+            .prefetch_related('tags', 'recipeingredients__ingredient')
         )
 
-    @admin.display(description='В избранном')
-    def count_in_favorite(self, recipe):
-        return recipe.count_in_favorite
-
     @admin.display(description='Изображение')
     @mark_safe
     def image_display(self, recipe):
         if not recipe.image:
             return '-'
+        url = thumbnail_url(recipe.image, recipe.image_thumbnails)
         return (
-            f"<img src='{recipe.image.url}' width='100' height='100' "
+            f"<img src='{url}' width='100' height='100' "
             "style='object-fit: cover;' />"
         )
 
@@ -275,9 +269,7 @@ class RecipeAdmin(admin.ModelAdmin):
             f'{recipe_ingredient.ingredient.name} '
             f'({recipe_ingredient.ingredient.measurement_unit}) - '
             f'{recipe_ingredient.amount}'
-            for recipe_ingredient in recipe.recipeingredients.select_related(
-                'ingredient'
-            )
+            for recipe_ingredient in recipe.recipeingredients.all()
         )
 
     @admin.display(description='Теги')
@@ -289,6 +281,9 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = (
         ('user', admin.RelatedOnlyFieldListFilter),
         ('recipe', admin.RelatedOnlyFieldListFilter),
@@ -298,6 +293,9 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_filter = (
         ('user', admin.RelatedOnlyFieldListFilter),
         ('recipe', admin.RelatedOnlyFieldListFilter),
@@ -0,0 +1,72 @@
+from hashlib import sha256
+from uuid import uuid4
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'versions:{}'
+ALL_RECIPES_SCOPE = 'recipes'
+
+
+def _new_version():
+    return uuid4().hex
+
+
+def get_versions(*scopes):
+    keys = {VERSION_KEY.format(scope): scope for scope in scopes}
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, timeout=None)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_version(scope):
+    return get_versions(scope)[scope]
+
+
+def find_version(scope):
+    """Версия области или None, если её ещё нет: в отличие от
+    get_version не создаёт запись в кэше."""
+    return cache.get(VERSION_KEY.format(scope))
+
+
+def forget_version(scope):
+    cache.delete(VERSION_KEY.format(scope))
+
+
+def bump_versions(*scopes):
+    cache.set_many(
+        {VERSION_KEY.format(scope): _new_version() for scope in scopes},
+        timeout=None,
+    )
+
+
+def recipe_scope(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def tag_scope(slug):
+    return f'tag:{slug}'
+
+
+def token_scope(key):
+    return f'token:{sha256(key.encode()).hexdigest()}'
+
+
+def recipe_scopes(recipes):
+    """Области кэша, которые затрагивает изменение рецептов."""
+    scopes = {ALL_RECIPES_SCOPE}
+    for recipe_id, author_id, slug in recipes.values_list(
+        'id', 'author_id', 'tags__slug'
+    ):
+        scopes.update((recipe_scope(recipe_id), author_scope(author_id)))
+        if slug:
+            scopes.add(tag_scope(slug))
+    return scopes
@@ -0,0 +1,63 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+
+# (модель со счётчиком, поле счётчика, считаемая модель, ссылка на владельца)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (User, 'subscriptions_count', Subscription, 'subscriber'),
+)
+
+
+def count_related(queryset, field):
+    """Подзапрос с числом строк queryset, ссылающихся полем field на pk."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('*'))
+            .values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def change_counters(instance, delta):
+    """Прибавляет delta к счётчикам объектов, на которые ссылается instance.
+
+    Обновление выполняется одним UPDATE с F(), поэтому одновременные
+    изменения не теряются; счётчик не опускается ниже нуля.
+    """
+    for model, field, counted, owner in COUNTERS:
+        if not isinstance(instance, counted):
+            continue
+        owners = model.objects.filter(pk=getattr(instance, f'{owner}_id'))
+        if delta < 0:
+            owners = owners.filter(**{f'{field}__gte': -delta})
+        owners.update(**{field: F(field) + delta})
+
+
+def reconcile_counters(check=False):
+    """Сверяет счётчики с фактическим числом строк.
+
+    Возвращает число расхождений по каждому счётчику; без check
+    исправляет их.
+    """
+    drift = {}
+    for model, field, counted, owner in COUNTERS:
+        actual = count_related(counted.objects, owner)
+        drifted = model.objects.exclude(**{field: actual})
+        if check:
+            drift[f'{model.__name__}.{field}'] = drifted.count()
+        else:
+            drift[f'{model.__name__}.{field}'] = drifted.update(
+                **{field: actual}
+            )
+    return drift
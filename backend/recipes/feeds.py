@@ -0,0 +1,174 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from .models import FeedEntry, Recipe, Subscription, User
+
+
+logger = logging.getLogger(__name__)
+
+PULLED_AT_KEY = 'feed_pulled:{}'
+
+_executor = None
+_executor_lock = Lock()
+
+
+def pulled_authors(prefix=''):
+    """Условие на авторов, чьи рецепты читатели забирают сами.
+
+    Раздавать в ленты при публикации слишком дорого рецепты авторов,
+    у которых очень много подписчиков или рецептов.
+    """
+    subscribers = settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    recipes = settings.FEED_FANOUT_MAX_RECIPES
+    return Q(**{f'{prefix}subscribers_count__gte': subscribers}) | Q(
+        **{f'{prefix}recipes_count__gte': recipes}
+    )
+
+
+def _entries(user_ids, recipes):
+    return [
+        FeedEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for user_id in user_ids
+        for recipe_id, author_id, pub_date in recipes
+    ]
+
+
+def _recipe_rows(recipes):
+    return recipes.values_list('pk', 'author_id', 'pub_date')
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора пачками.
+
+    Рецепты авторов из pulled_authors() не раздаются. После каждой
+    пачки удаляются записи тех, кто успел отписаться: их ленты могли
+    быть очищены раньше, чем пачка записана.
+    """
+    rows = list(_recipe_rows(Recipe.objects.filter(pk=recipe_id)))
+    if not rows:
+        return
+    author_id = rows[0][1]
+    if User.objects.filter(pulled_authors(), pk=author_id).exists():
+        return
+    subscribers = Subscription.objects.filter(author_id=author_id).order_by(
+        'subscriber_id'
+    )
+    last_id = 0
+    while True:
+        batch = list(
+            subscribers.filter(subscriber_id__gt=last_id).values_list(
+                'subscriber_id', flat=True
+            )[: settings.FEED_FANOUT_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            _entries(batch, rows), ignore_conflicts=True
+        )
+        FeedEntry.objects.filter(
+            recipe_id=recipe_id, user_id__in=batch
+        ).exclude(
+            user__subscribers__author_id=author_id
+        ).delete()
+        last_id = batch[-1]
+
+
+def _fan_out_in_thread(recipe_id):
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception('Не удалось разослать рецепт %s по лентам', recipe_id)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FEED_FANOUT_WORKERS,
+                thread_name_prefix='feed-fan-out',
+            )
+    return _executor
+
+
+def schedule_fan_out(recipe_id):
+    """Раздаёт новый рецепт по лентам в пуле потоков, вне запроса.
+
+    Очередь пула живёт в памяти процесса: раздачи, прерванные его
+    остановкой, восстанавливает команда rebuild_feeds.
+    """
+    if not settings.FEED_FANOUT_WORKERS:
+        fan_out(recipe_id)
+        return
+    _get_executor().submit(_fan_out_in_thread, recipe_id)
+
+
+def backfill(subscriber_id, author_id):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    FeedEntry.objects.bulk_create(
+        _entries(
+            (subscriber_id,),
+            _recipe_rows(
+                Recipe.objects.filter(author_id=author_id).order_by(
+                    '-pub_date', '-pk'
+                )[: settings.FEED_BACKFILL_SIZE]
+            ),
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def trim(subscriber_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=subscriber_id, author_id=author_id
+    ).delete()
+
+
+def pull(user):
+    """Забирает в ленту новые рецепты авторов из pulled_authors().
+
+    Выполняется не чаще раза в FEED_PULL_INTERVAL секунд. Рецепты
+    выбираются с перекрытием в тот же интервал, чтобы не пропустить
+    опубликованные в ещё не зафиксированных транзакциях; повторы
+    отбрасываются ограничением уникальности. Как и при подписке,
+    забирается не больше FEED_BACKFILL_SIZE последних рецептов.
+    """
+    key = PULLED_AT_KEY.format(user.pk)
+    now = time()
+    pulled_at = cache.get(key)
+    interval = settings.FEED_PULL_INTERVAL
+    if pulled_at is not None and now - pulled_at < interval:
+        return
+    cache.set(key, now, None)
+    recipes = Recipe.objects.filter(
+        author__in=Subscription.objects.filter(
+            pulled_authors('author__'), subscriber=user
+        ).values('author_id')
+    ).order_by('-pub_date', '-pk')
+    if pulled_at is not None:
+        recipes = recipes.filter(
+            pub_date__gte=datetime.fromtimestamp(
+                pulled_at - interval, timezone.utc
+            )
+        )
+    rows = list(_recipe_rows(recipes[: settings.FEED_BACKFILL_SIZE]))
+    if rows:
+        FeedEntry.objects.bulk_create(
+            _entries((user.pk,), rows), ignore_conflicts=True
+        )
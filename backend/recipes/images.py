@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+from threading import Lock
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+
+_executor = None
+_executor_lock = Lock()
+
+
+def thumbnail_names(name):
+    """Имена уменьшенных копий, производные от имени исходного файла."""
+    root = os.path.splitext(name)[0]
+    return {
+        str(size): {
+            extension: f'{root}_{size}.{extension}' for extension in FORMATS
+        }
+        for size in settings.THUMBNAIL_SIZES
+    }
+
+
+def make_thumbnails(name):
+    """Сохраняет уменьшенные копии изображения во всех размерах и форматах.
+
+    Уже существующие копии не пересоздаются: исходный файл лежит в
+    контентно-адресуемом хранилище, поэтому копии с производными именами
+    не устаревают. Выполняется в процессе пула, поэтому не обращается
+    к базе данных.
+    """
+    sizes = thumbnail_names(name)
+    image = None
+    for size, names in sizes.items():
+        thumbnail = None
+        for extension, thumbnail_name in names.items():
+            if default_storage.exists(thumbnail_name):
+                continue
+            if image is None:
+                with default_storage.open(name) as file:
+                    image = ImageOps.exif_transpose(
+                        Image.open(file)
+                    ).convert('RGB')
+            if thumbnail is None:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((int(size), int(size)))
+            buffer = BytesIO()
+            thumbnail.save(buffer, FORMATS[extension], quality=QUALITY)
+            names[extension] = default_storage.save(
+                thumbnail_name, ContentFile(buffer.getvalue())
+            )
+    return {'source': name, 'sizes': sizes}
+
+
+def delete_image(storage, name):
+    """Удаляет исходный файл вместе с его уменьшенными копиями."""
+    storage.delete(name)
+    for names in thumbnail_names(name).values():
+        for thumbnail_name in names.values():
+            default_storage.delete(thumbnail_name)
+
+
+def _get_executor(broken=None):
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor is broken:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+    return _executor
+
+
+def _store_thumbnails(queryset, field_name, name, on_stored, future):
+    try:
+        thumbnails = future.result()
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+        return
+    try:
+        if queryset.filter(**{field_name: name}).update(
+            **{f'{field_name}_thumbnails': thumbnails}
+        ):
+            on_stored()
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(queryset, field_name, name, on_stored):
+    """Ставит изображение в очередь пула процессов.
+
+    Результат записывается в поле <field_name>_thumbnails, только если
+    изображение объекта за это время не сменилось.
+    """
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        queryset.filter(**{field_name: name}).update(
+            **{f'{field_name}_thumbnails': make_thumbnails(name)}
+        )
+        on_stored()
+        return
+    executor = _get_executor()
+    try:
+        future = executor.submit(make_thumbnails, name)
+    except BrokenProcessPool:
+        future = _get_executor(broken=executor).submit(make_thumbnails, name)
+    future.add_done_callback(
+        partial(_store_thumbnails, queryset, field_name, name, on_stored)
+    )
@@ -0,0 +1,295 @@
+import csv
+import json
+import os
+import re
+from io import StringIO
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from .cache_versions import bump_versions
+
+
+CHUNK_SIZE = 1 << 16
+LOOKUP_BATCH_SIZE = 500
+WHITESPACE = re.compile(r'\s*')
+
+
+def as_record(item, label):
+    if not isinstance(item, dict):
+        raise ValueError(f'{label} не является объектом JSON')
+    return item
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_ndjson(file):
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if line:
+            yield as_record(json.loads(line), f'Строка {number}')
+
+
+def read_json_array(file):
+    """Читает массив JSON по одному объекту, не загружая файл целиком.
+
+    Элементы разделяются ровно одной запятой, как в обычном JSON.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, number = '', 0, 0
+    expected = '['
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            buffer, position = file.read(CHUNK_SIZE), 0
+            if not buffer:
+                raise ValueError('Неожиданный конец файла JSON')
+            continue
+        char = buffer[position]
+        if expected == '[':
+            if char != '[':
+                raise ValueError('Ожидался массив JSON')
+            expected = 'item or ]'
+            position += 1
+            continue
+        if char == ']' and expected != 'item':
+            return
+        if expected == ', or ]':
+            if char != ',':
+                raise ValueError(
+                    f'Ожидалась запятая после элемента {number} массива'
+                )
+            expected = 'item'
+            position += 1
+            continue
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        number += 1
+        yield as_record(item, f'Элемент {number} массива')
+        expected = ', or ]'
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json_array,
+    'ndjson': read_ndjson,
+    'jsonl': read_ndjson,
+}
+
+
+def get_format(path):
+    return os.path.splitext(path)[1].lstrip('.').lower()
+
+
+class Importer:
+    """Пакетная вставка записей с обновлением по естественному ключу.
+
+    Лишние поля записей отбрасываются, записи с пустым ключом
+    пропускаются. На PostgreSQL пакет загружается через COPY во
+    временную таблицу и переносится одним INSERT ... ON CONFLICT,
+    на остальных БД — через bulk_create и bulk_update.
+    """
+
+    def __init__(self, model, key_fields, update_fields=(), batch_size=5000):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.update_fields = tuple(update_fields)
+        self.fields = self.key_fields + self.update_fields
+        self.batch_size = batch_size
+        self.processed = self.written = self.skipped = 0
+
+    def clean(self, record):
+        row = {}
+        for field in self.fields:
+            value = record.get(field)
+            row[field] = value.strip() if isinstance(value, str) else value
+        if any(row[field] in (None, '') for field in self.key_fields):
+            return None
+        return row
+
+    def get_key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def run(self, records, on_progress=None):
+        records = iter(records)
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self.create_staging_table()
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                rows = {}
+                for record in batch:
+                    row = self.clean(record)
+                    if row is None:
+                        self.skipped += 1
+                    else:
+                        rows[self.get_key(row)] = row
+                if connection.vendor == 'postgresql':
+                    self.written += self.copy_batch(rows.values())
+                else:
+                    self.written += self.upsert_batch(rows)
+                self.processed += len(batch)
+                if on_progress:
+                    on_progress(self)
+
+    @property
+    def table(self):
+        return connection.ops.quote_name(self.model._meta.db_table)
+
+    @property
+    def staging_table(self):
+        return connection.ops.quote_name(
+            f'{self.model._meta.db_table}_import'
+        )
+
+    def get_columns(self, fields):
+        return [
+            connection.ops.quote_name(self.model._meta.get_field(field).column)
+            for field in fields
+        ]
+
+    def create_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {self.staging_table} '
+                'ON COMMIT DROP AS SELECT '
+                f'{", ".join(self.get_columns(self.fields))} '
+                f'FROM {self.table} WITH NO DATA'
+            )
+
+    def copy_batch(self, rows):
+        buffer = StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for row in rows:
+            writer.writerow(row[field] for field in self.fields)
+        buffer.seek(0)
+        columns = ', '.join(self.get_columns(self.fields))
+        keys = ', '.join(self.get_columns(self.key_fields))
+        if self.update_fields:
+            updated = self.get_columns(self.update_fields)
+            current = ', '.join(f'target.{column}' for column in updated)
+            excluded = ', '.join(f'EXCLUDED.{column}' for column in updated)
+            on_conflict = (
+                f'DO UPDATE SET ({", ".join(updated)}) = ROW({excluded}) '
+                f'WHERE ROW({current}) IS DISTINCT FROM ROW({excluded})'
+            )
+        else:
+            on_conflict = 'DO NOTHING'
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {self.staging_table} ({columns}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} AS target ({columns}) '
+                f'SELECT {columns} FROM {self.staging_table} '
+                f'ON CONFLICT ({keys}) {on_conflict}'
+            )
+            written = cursor.rowcount
+            cursor.execute(f'TRUNCATE {self.staging_table}')
+        return written
+
+    def get_existing(self, keys):
+        """Находит уже сохранённые записи пакета по естественному ключу."""
+        first_field = self.key_fields[0]
+        keys = list(keys)
+        existing = {}
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            values = {key[0] for key in keys[start:start + LOOKUP_BATCH_SIZE]}
+            for instance in self.model.objects.filter(
+                **{f'{first_field}__in': values}
+            ).only('pk', *self.fields):
+                key = tuple(
+                    getattr(instance, field) for field in self.key_fields
+                )
+                existing[key] = instance
+        return existing
+
+    def upsert_batch(self, rows):
+        existing = self.get_existing(rows)
+        created, updated = [], []
+        for key, row in rows.items():
+            instance = existing.get(key)
+            if instance is None:
+                created.append(self.model(**row))
+                continue
+            if any(
+                getattr(instance, field) != row[field]
+                for field in self.update_fields
+            ):
+                for field in self.update_fields:
+                    setattr(instance, field, row[field])
+                updated.append(instance)
+        self.model.objects.bulk_create(created, ignore_conflicts=True)
+        if updated:
+            self.model.objects.bulk_update(updated, self.update_fields)
+        return len(created) + len(updated)
+
+
+class ImportCommand(BaseCommand):
+    """Основа команд импорта справочников из CSV, JSON и NDJSON."""
+
+    help = 'Import data from a CSV, JSON or NDJSON file into the database'
+    default_path = None
+    model = None
+    key_fields = ()
+    update_fields = ()
+    scope = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=self.default_path)
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Defaults to the file extension',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def report_progress(self, importer):
+        self.stdout.write(
+            f'Processed {importer.processed} rows', ending='\r'
+        )
+        self.stdout.flush()
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or get_format(options['path'])
+        if file_format not in READERS:
+            raise CommandError(
+                f'Unknown file format "{file_format}", use --format'
+            )
+        importer = Importer(
+            self.model,
+            self.key_fields,
+            self.update_fields,
+            options['batch_size'],
+        )
+        show_progress = options['verbosity'] > 0 and self.stdout.isatty()
+        try:
+            with open(options['path'], 'r', encoding='utf-8') as file:
+                importer.run(
+                    READERS[file_format](file),
+                    self.report_progress if show_progress else None,
+                )
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(f'Import failed: {error}')
+        bump_versions(self.scope)
+        if show_progress:
+            self.stdout.write('')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Data imported successfully: {importer.processed} rows, '
+                f'{importer.written} written, {importer.skipped} skipped'
+            )
+        )
@@ -0,0 +1,55 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from db.postgresql.pool import close_pools
+
+from .benchmark_reads import percentile
+
+ENGINES = (
+    ('direct', 'django.db.backends.postgresql'),
+    ('pooled', 'db.postgresql'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the database connection cost of one request: connect, '
+        'run SELECT 1 and close, as with CONN_MAX_AGE=0, using a new '
+        'connection each time and using the connection pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def measure(self, wrapper, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = perf_counter()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+            timings.append((perf_counter() - started) * 1000)
+        return sorted(timings)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        settings_dict = connections[alias].settings_dict
+        if connections[alias].vendor != 'postgresql':
+            raise CommandError('The benchmark needs a PostgreSQL database')
+        for title, engine in ENGINES:
+            wrapper = load_backend(engine).DatabaseWrapper(
+                {**settings_dict, 'ENGINE': engine}, alias
+            )
+            timings = self.measure(wrapper, options['iterations'])
+            self.stdout.write(
+                f'{title}: mean {sum(timings) / len(timings):.2f} ms, '
+                + ', '.join(
+                    f'p{percent} {percentile(timings, percent):.2f} ms'
+                    for percent in (50, 95, 99)
+                )
+            )
+        close_pools()
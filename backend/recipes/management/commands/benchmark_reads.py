@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from threading import local
+from time import perf_counter
+
+import requests
+from django.core.management.base import BaseCommand
+
+DEFAULT_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=а',
+    '/api/recipes/',
+    '/api/recipes/?limit=6&page=2',
+)
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0
+    return sorted_values[
+        min(len(sorted_values) - 1, len(sorted_values) * percent // 100)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load a running server with concurrent GET requests and report '
+        'throughput and latency. Run it against the WSGI and the ASGI '
+        '(ASYNC_VIEWS=True) deployments started with the same number of '
+        'workers to compare them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='e.g. http://127.0.0.1:10000')
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Path to request, may be repeated '
+            '(recipe detail and /s/<code>/ links are added automatically)',
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--token', help='Send "Authorization: Token <token>"'
+        )
+
+    def discover_paths(self, base_url, session):
+        response = session.get(f'{base_url}/api/recipes/?limit=1')
+        response.raise_for_status()
+        results = response.json()['results']
+        if not results:
+            return []
+        recipe_id = results[0]['id']
+        link = session.get(f'{base_url}/api/recipes/{recipe_id}/get-link/')
+        link.raise_for_status()
+        short_link = link.json()['short-link']
+        return [
+            f'/api/recipes/{recipe_id}/',
+            short_link[short_link.index('/s/'):],
+        ]
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        sessions = local()
+
+        def get_session():
+            if not hasattr(sessions, 'session'):
+                sessions.session = requests.Session()
+                sessions.session.headers.update(headers)
+            return sessions.session
+
+        paths = options['paths'] or [
+            *DEFAULT_PATHS,
+            *self.discover_paths(base_url, get_session()),
+        ]
+
+        def fetch(path):
+            started = perf_counter()
+            response = get_session().get(
+                f'{base_url}{path}', allow_redirects=False
+            )
+            return path, response.status_code, perf_counter() - started
+
+        plan = list(islice(cycle(paths), options['requests']))
+        started = perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(fetch, plan))
+        elapsed = perf_counter() - started
+
+        self.stdout.write(
+            f'{len(results)} requests, concurrency '
+            f'{options["concurrency"]}: {len(results) / elapsed:.1f} req/s'
+        )
+        for path in paths:
+            timings = sorted(
+                duration * 1000
+                for result_path, _, duration in results
+                if result_path == path
+            )
+            errors = sum(
+                1
+                for result_path, status, _ in results
+                if result_path == path and status >= 400
+            )
+            self.stdout.write(
+                f'{path}: '
+                + ', '.join(
+                    f'p{percent} {percentile(timings, percent):.1f} ms'
+                    for percent in (50, 95, 99)
+                )
+                + f', errors {errors}'
+            )
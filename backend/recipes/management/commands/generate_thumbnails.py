@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_thumbnails
+from recipes.models import Recipe, User
+
+BATCH_SIZE = 500
+TARGETS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails for recipe images and avatars'
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field_name in TARGETS:
+            rows = (
+                model.objects.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list('pk', field_name, f'{field_name}_thumbnails')
+                .iterator(chunk_size=BATCH_SIZE)
+            )
+            for pk, name, thumbnails in rows:
+                if thumbnails.get('source') == name:
+                    continue
+                model.objects.filter(pk=pk, **{field_name: name}).update(
+                    **{f'{field_name}_thumbnails': make_thumbnails(name)}
+                )
+                total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Generated thumbnails for {total} images')
+        )
@@ -1,20 +1,10 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Ingredient
+from recipes.signals import INGREDIENTS_SCOPE
 
-PATH_CSV = 'data/ingredients.csv'
-
-
-class Command(BaseCommand):
-    help = 'Import data from CSV file into the database'
 
-    def handle(self, *args, **kwargs):
-        with open(PATH_CSV, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            Ingredient.objects.bulk_create(
-                (Ingredient(**row) for row in csv_reader),
-                ignore_conflicts=True,
-            )
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+class Command(ImportCommand):
+    default_path = 'data/ingredients.csv'
+    model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+    scope = INGREDIENTS_SCOPE
@@ -1,20 +1,10 @@
-import json
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Ingredient
+from recipes.signals import INGREDIENTS_SCOPE
 
-PATH_JSON = 'data/ingredients.json'
-
-
-class Command(BaseCommand):
-    help = 'Import data from JSON file into the database'
 
-    def handle(self, *args, **kwargs):
-        with open(PATH_JSON, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            Ingredient.objects.bulk_create(
-                (Ingredient(**ingredient) for ingredient in data),
-                ignore_conflicts=True,
-            )
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+class Command(ImportCommand):
+    default_path = 'data/ingredients.json'
+    model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+    scope = INGREDIENTS_SCOPE
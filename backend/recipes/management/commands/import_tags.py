@@ -1,18 +1,11 @@
-import csv
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Tag
+from recipes.signals import TAGS_SCOPE
 
-PATH_CSV = 'data/recipes_tag.csv'
-
-
-class Command(BaseCommand):
-    help = 'Import data from CSV file into the database'
 
-    def handle(self, *args, **kwargs):
-        with open(PATH_CSV, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            Tag.objects.bulk_create((Tag(**tag) for tag in csv_reader),
-                                    ignore_conflicts=True)
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+class Command(ImportCommand):
+    default_path = 'data/recipes_tag.csv'
+    model = Tag
+    key_fields = ('slug',)
+    update_fields = ('name',)
+    scope = TAGS_SCOPE
@@ -1,18 +1,11 @@
-import json
-
-from django.core.management.base import BaseCommand
-
+from recipes.importers import ImportCommand
 from recipes.models import Tag
+from recipes.signals import TAGS_SCOPE
 
-PATH_JSON = 'data/recipes_tag.json'
-
-
-class Command(BaseCommand):
-    help = 'Import data from JSON file into the database'
 
-    def handle(self, *args, **kwargs):
-        with open(PATH_JSON, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            Tag.objects.bulk_create((Tag(**tag) for tag in data),
-                                    ignore_conflicts=True)
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+class Command(ImportCommand):
+    default_path = 'data/recipes_tag.json'
+    model = Tag
+    key_fields = ('slug',)
+    update_fields = ('name',)
+    scope = TAGS_SCOPE
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from recipes.feeds import pulled_authors
+from recipes.models import FeedEntry, Subscription
+
+BATCH_SIZE = 1000
+
+
+def missing_entries(since, after=Q()):
+    """Рецепты подписок, опубликованные после since и не попавшие в ленты.
+
+    Так бывает, если процесс завершился, не успев раздать рецепт.
+    Рецепты авторов из pulled_authors() читатели забирают сами. Условие
+    after относится к тому же рецепту, поэтому задаётся здесь, а не
+    отдельным filter().
+    """
+    return (
+        Subscription.objects.filter(
+            Q(author__recipes__pub_date__gte=since) & after
+        )
+        .exclude(pulled_authors('author__'))
+        .annotate(
+            in_feed=Exists(
+                FeedEntry.objects.filter(
+                    user=OuterRef('subscriber'),
+                    recipe=OuterRef('author__recipes'),
+                )
+            )
+        )
+        .filter(in_feed=False)
+        .order_by('author__recipes__id', 'subscriber_id')
+        .values_list(
+            'author__recipes__id',
+            'subscriber_id',
+            'author_id',
+            'author__recipes__pub_date',
+        )
+    )
+
+
+def add_missing_entries(since):
+    """Добавляет недостающие записи пачками по ключу (рецепт, читатель)."""
+    added, after = 0, Q()
+    while True:
+        batch = list(missing_entries(since, after)[:BATCH_SIZE])
+        if not batch:
+            return added
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, user_id, author_id, pub_date in batch
+            ),
+            ignore_conflicts=True,
+        )
+        added += len(batch)
+        recipe_id, user_id = batch[-1][:2]
+        after = Q(author__recipes__id__gt=recipe_id) | Q(
+            author__recipes__id=recipe_id, subscriber_id__gt=user_id
+        )
+
+
+def stale_entries():
+    """Записи лент об авторах, на которых пользователь не подписан."""
+    return FeedEntry.objects.exclude(
+        Exists(
+            Subscription.objects.filter(
+                subscriber=OuterRef('user'), author=OuterRef('author')
+            )
+        )
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Add recipes missing from subscription feeds and remove entries '
+        'of authors the user is no longer subscribed to'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Look for missing recipes published in the last N days',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report the number of missing and stale entries',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        if options['check']:
+            self.stdout.write(
+                f'Missing entries: {missing_entries(since).count()}'
+            )
+            self.stdout.write(f'Stale entries: {stale_entries().count()}')
+            return
+        self.stdout.write(f'Missing entries: {add_missing_entries(since)}')
+        self.stdout.write(f'Stale entries: {stale_entries().delete()[0]}')
+        self.stdout.write(self.style.SUCCESS('Feeds rebuilt successfully'))
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingCartIngredient
+
+BATCH_SIZE = 1000
+
+
+def expected_totals():
+    return (
+        (row['recipe__shoppingcarts__user'], row['ingredient'], row['total'])
+        for row in RecipeIngredient.objects.filter(
+            recipe__shoppingcarts__isnull=False
+        )
+        .values('recipe__shoppingcarts__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by('recipe__shoppingcarts__user_id', 'ingredient_id')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+
+
+def stored_totals():
+    return ShoppingCartIngredient.objects.order_by(
+        'user_id', 'ingredient_id'
+    ).values_list('user', 'ingredient', 'amount').iterator(
+        chunk_size=BATCH_SIZE
+    )
+
+
+def count_drift(expected, stored):
+    """Сливает два упорядоченных потока и считает расхождения.
+
+    Потоки упорядочены по id: order_by() по внешнему ключу сортировал
+    бы по Meta.ordering связанной модели.
+    """
+    drift = 0
+    expected_row, stored_row = next(expected, None), next(stored, None)
+    while expected_row or stored_row:
+        if stored_row is None or (
+            expected_row and expected_row[:2] < stored_row[:2]
+        ):
+            drift += 1
+            expected_row = next(expected, None)
+        elif expected_row is None or stored_row[:2] < expected_row[:2]:
+            drift += 1
+            stored_row = next(stored, None)
+        else:
+            drift += expected_row[2] != stored_row[2]
+            expected_row, stored_row = next(expected, None), next(stored, None)
+    return drift
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-user shopping cart ingredient totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report the number of drifted rows',
+        )
+
+    def handle(self, *args, **options):
+        drift = count_drift(expected_totals(), stored_totals())
+        self.stdout.write(f'Drifted rows: {drift}')
+        if options['check']:
+            return
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for user_id, ingredient_id, amount in expected_totals()
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        self.stdout.write(self.style.SUCCESS('Totals rebuilt successfully'))
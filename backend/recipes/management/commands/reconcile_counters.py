@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized favorite, recipe and subscription counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report the number of drifted rows',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(check=options['check'])
+        for counter, rows in drift.items():
+            self.stdout.write(f'{counter}: {rows} drifted rows')
+        if options['check']:
+            return
+        self.stdout.write(
+            self.style.SUCCESS('Counters reconciled successfully')
+        )
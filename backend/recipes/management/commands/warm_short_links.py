@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.short_links import short_link_resolver
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Load recipe short links into the shared cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Warm only the latest N recipes',
+        )
+
+    def handle(self, *args, **options):
+        links = Recipe.objects.values_list('short_url_code', 'id')[
+            : options['limit']
+        ].iterator(chunk_size=BATCH_SIZE)
+        batch, total = [], 0
+        for link in links:
+            batch.append(link)
+            if len(batch) == BATCH_SIZE:
+                short_link_resolver.warm(batch)
+                total += len(batch)
+                batch = []
+        short_link_resolver.warm(batch)
+        total += len(batch)
+        self.stdout.write(
+            self.style.SUCCESS(f'Warmed {total} short links successfully')
+        )
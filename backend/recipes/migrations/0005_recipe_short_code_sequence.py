@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+SEQUENCE = 'recipes_short_code_seq'
+BLOCK_SIZE = 100
+
+
+def create_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE SEQUENCE {SEQUENCE} '
+            f'INCREMENT BY {BLOCK_SIZE} MINVALUE 0 START WITH 0'
+        )
+    else:
+        schema_editor.execute(
+            f'CREATE TABLE {SEQUENCE} '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT)'
+        )
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE {SEQUENCE}')
+    else:
+        schema_editor.execute(f'DROP TABLE {SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_url_code',
+            field=models.SlugField(max_length=7, unique=True, verbose_name='Код рецепта'),
+        ),
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.25 on 2026-10-18 01:36
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+import recipes.storage
+
+
+def count_media_references(apps, schema_editor):
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    references = Counter()
+    for model_name, field_name in (('Recipe', 'image'), ('User', 'avatar')):
+        references.update(
+            dict(
+                apps.get_model('recipes', model_name)
+                .objects.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name)
+                .annotate(total=Count('pk'))
+                .order_by()
+            )
+        )
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=name, references=total)
+            for name, total in references.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Путь к файлу')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='users/avatars', verbose_name='Фото профиля'),
+        ),
+        migrations.RunPython(
+            count_media_references, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 01:42
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    duplicates = list(
+        Ingredient.objects.values('name', 'measurement_unit')
+        .annotate(keep=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        duplicate_ids = list(
+            Ingredient.objects.filter(
+                name=row['name'], measurement_unit=row['measurement_unit']
+            )
+            .exclude(id=row['keep'])
+            .values_list('id', flat=True)
+        )
+        for model_name, owner in (
+            ('RecipeIngredient', 'recipe_id'),
+            ('ShoppingCartIngredient', 'user_id'),
+        ):
+            model = apps.get_model('recipes', model_name)
+            for item in model.objects.filter(ingredient_id__in=duplicate_ids):
+                kept, created = model.objects.get_or_create(
+                    **{owner: getattr(item, owner)},
+                    ingredient_id=row['keep'],
+                    defaults={'amount': item.amount},
+                )
+                if not created:
+                    kept.amount += item.amount
+                    kept.save(update_fields=('amount',))
+                item.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_media_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
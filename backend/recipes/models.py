@@ -1,13 +1,13 @@
-from random import choices
-from string import ascii_letters, digits
-
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
-from django.db import models, IntegrityError
+from django.db import models
+from django.db.models import Case, Exists, F, OuterRef, Value, When
 from django.db.models.constraints import UniqueConstraint
 from django.urls import reverse
 
+from .short_codes import CODE_LENGTH, short_code_allocator
+from .storage import content_addressed_storage
 from .validators import validate_username
 
 
@@ -24,6 +24,7 @@ class VerboseName:
     INGREDIENT = 'Продукт'
     AUTHOR = 'Автор'
     IMAGE = 'Изображение'
+    IMAGE_THUMBNAILS = 'Уменьшенные копии изображения'
     TEXT = 'Описание'
     COOKING_TIME = 'Время приготовления (в минутах)'
     PUB_DATE = 'Дата публикации'
@@ -31,17 +32,28 @@ class VerboseName:
     AMOUNT = 'Мера'
     FAVORITE = 'Избранное'
     SHOPPING_CART = 'Корзина покупок'
+    SHOPPING_CART_INGREDIENT = 'Продукт корзины покупок'
     EMAIL = 'Эл. почта'
     USERNAME = 'Уникальный юзернейм'
     FIRST_NAME = 'Имя'
     LAST_NAME = 'Фамилия'
     AVATAR = 'Фото профиля'
+    AVATAR_THUMBNAILS = 'Уменьшенные копии фото профиля'
     AUTHOR = 'Автор'
     SUBSCRIBER = 'Подписчик'
     SUBSCRIPTION = 'Подписка'
     USER = 'Пользователь'
     RECIPE_INGREDIENT = 'Продукт рецепта'
     SHORT_URL_CODE = 'Код рецепта'
+    MEDIA_FILE = 'Медиафайл'
+    MEDIA_FILE_NAME = 'Путь к файлу'
+    REFERENCES = 'Число ссылок'
+    FAVORITES_COUNT = 'В избранном'
+    SHOPPING_CARTS_COUNT = 'В корзинах покупок'
+    RECIPES_COUNT = 'Рецепты'
+    SUBSCRIBERS_COUNT = 'Подписчики'
+    SUBSCRIPTIONS_COUNT = 'Подписки'
+    FEED_ENTRY = 'Запись ленты подписок'
 
 
 class VerboseNamePlural:
@@ -50,10 +62,13 @@ class VerboseNamePlural:
     RECIPES = 'Рецепты'
     FAVORITES = 'Избранные рецепты'
     SHOPPING_CARTS = 'Корзины покупок'
+    SHOPPING_CART_INGREDIENTS = 'Продукты корзин покупок'
     SUBSCRIPTIONS = 'Подписки'
     USERS = 'Пользователи'
     RECIPE_INGREDIENTS = 'Продукты рецепта'
     SHORT_URL_CODE = 'Коды рецептов'
+    MEDIA_FILES = 'Медиафайлы'
+    FEED_ENTRIES = 'Записи лент подписок'
 
 
 class FieldLength:
@@ -65,7 +80,8 @@ class FieldLength:
     USERNAME = 150
     FIRST_NAME = 150
     LAST_NAME = 150
-    SHORT_URL_CODE = 6
+    SHORT_URL_CODE = CODE_LENGTH
+    MEDIA_FILE_NAME = 100
 
 
 class Error:
@@ -83,13 +99,53 @@ class Error:
     NO_TAGS = 'Нужен хотя бы один тег'
     NO_INGREDIENTS = 'Рецепт не может обойтись без продуктов'
     NOT_EXIST = 'Рецепт не существует'
-    SHORT_URL_CODE = 'Не удалось сгенерировать уникальный код'
-    SHORT_URL_CODE_GEN = (
-        'Превышено количество попыток генерации short_url_code.'
-    )
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не перезаписывает счётчики при сохранении существующего объекта.
+
+    Счётчики меняются только запросами UPDATE с F() (см. counters.py),
+    а save() загруженного ранее объекта записал бы устаревшие значения.
+    Поэтому UPDATE без явных update_fields их не трогает, а INSERT,
+    в том числе копии или строки, удалённой другим запросом, пишет их
+    как обычно.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if (
+            update_fields is None
+            and deferred
+            and self.pk is not None
+            and not kwargs.get('force_insert')
+        ):
+            # Django сам сохранил бы все загруженные поля со счётчиками.
+            update_fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    def _do_update(
+        self, base_qs, using, pk_val, values, update_fields, forced_update
+    ):
+        if update_fields is None:
+            values = [
+                value
+                for value in values
+                if value[0].name not in self.counter_fields
+            ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update
+        )
+
+
+class User(CounterFieldsMixin, AbstractUser):
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -116,6 +172,30 @@ class User(AbstractUser):
         null=True,
         blank=True,
         upload_to=settings.AVATARS_PATH,
+        storage=content_addressed_storage,
+    )
+    avatar_thumbnails = models.JSONField(
+        verbose_name=VerboseName.AVATAR_THUMBNAILS,
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name=VerboseName.RECIPES_COUNT, default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name=VerboseName.SUBSCRIBERS_COUNT, default=0, editable=False
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        verbose_name=VerboseName.SUBSCRIPTIONS_COUNT,
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = (
+        'recipes_count',
+        'subscribers_count',
+        'subscriptions_count',
     )
 
     class Meta(AbstractUser.Meta):
@@ -193,15 +273,40 @@ class Ingredient(models.Model):
         verbose_name_plural = VerboseNamePlural.INGREDIENTS
         default_related_name = '%(class)ss'
         ordering = ('name',)
+        constraints = (
+            UniqueConstraint(
+                fields=('name', 'measurement_unit'), name='unique_%(class)s'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
-    MAX_ATTEMPTS = 30
-    AVAILIBLE_CHARS = ascii_letters + digits
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Subscription.objects.filter(
+                    subscriber=user, author=OuterRef('author')
+                )
+            ),
+        )
+
 
+class Recipe(CounterFieldsMixin, models.Model):
     name = models.CharField(
         verbose_name=VerboseName.NAME,
         max_length=FieldLength.RECIPE_NAME,
@@ -218,6 +323,13 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name=VerboseName.IMAGE,
         upload_to=settings.RECIPES_IMAGES_PATH,
+        storage=content_addressed_storage,
+    )
+    image_thumbnails = models.JSONField(
+        verbose_name=VerboseName.IMAGE_THUMBNAILS,
+        default=dict,
+        blank=True,
+        editable=False,
     )
     text = models.TextField(verbose_name=VerboseName.TEXT)
     cooking_time = models.PositiveIntegerField(
@@ -237,12 +349,29 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         verbose_name=VerboseName.PUB_DATE, auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name=VerboseName.FAVORITES_COUNT, default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        verbose_name=VerboseName.SHOPPING_CARTS_COUNT,
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'shopping_carts_count')
 
     class Meta:
         verbose_name = VerboseName.RECIPE
         verbose_name_plural = VerboseNamePlural.RECIPES
         default_related_name = '%(class)ss'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date'), name='recipe_author_date_idx'
+            ),
+            models.Index(fields=('-pub_date', '-id'), name='recipe_date_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -250,29 +379,10 @@ class Recipe(models.Model):
     def get_absolute_url(self):
         return reverse('recipes:short_link', args=[self.pk])
 
-    @staticmethod
-    def generate_short(self):
-        for _ in range(self.MAX_ATTEMPTS):
-            short = ''.join(
-                choices(self.AVAILIBLE_CHARS, k=FieldLength.SHORT_URL_CODE)
-            )
-            if not Recipe.objects.filter(short_url_code=short).exists():
-                return short
-        raise RuntimeError(Error.SHORT_URL_CODE)
-
     def save(self, *args, **kwargs):
         if not self.short_url_code:
-            self.short_url_code = self.generate_short()
-        attempts = 0
-        while True:
-            try:
-                super().save(*args, **kwargs)
-                break
-            except IntegrityError:
-                attempts += 1
-                if attempts >= self.MAX_ATTEMPTS:
-                    raise RuntimeError(Error.SHORT_URL_CODE_GEN)
-                self.short_url_code = self.generate_short()
+            self.short_url_code = short_code_allocator.allocate()
+        super().save(*args, **kwargs)
 
 
 class RecipeIngredient(models.Model):
@@ -333,6 +443,11 @@ class BaseUserRecipeModel(models.Model):
                 name='unique_%(class)s',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='%(class)s_recipe_user_idx'
+            ),
+        ]
 
 
 class Favorite(BaseUserRecipeModel):
@@ -345,3 +460,188 @@ class ShoppingCart(BaseUserRecipeModel):
     class Meta(BaseUserRecipeModel.Meta):
         verbose_name = VerboseName.SHOPPING_CART
         verbose_name_plural = VerboseNamePlural.SHOPPING_CARTS
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сумма продукта по всем рецептам корзины пользователя."""
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseName.USER,
+    )
+    ingredient = models.ForeignKey(
+        to=Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseName.INGREDIENT,
+    )
+    amount = models.IntegerField(verbose_name=VerboseName.AMOUNT)
+
+    class Meta:
+        default_related_name = '%(class)ss'
+        ordering = ('user', 'ingredient')
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'ingredient'), name='unique_%(class)s'
+            ),
+        )
+        verbose_name = VerboseName.SHOPPING_CART_INGREDIENT
+        verbose_name_plural = VerboseNamePlural.SHOPPING_CART_INGREDIENTS
+
+    def __str__(self) -> str:
+        return f'{self.ingredient} в корзине {self.user} - {self.amount}'
+
+    @classmethod
+    def apply_deltas(cls, user_ids, deltas):
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items()
+            if delta
+        }
+        if not deltas:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        cls.objects.bulk_create(
+            (
+                cls(user_id=user_id, ingredient_id=ingredient_id, amount=0)
+                for user_id in user_ids
+                for ingredient_id in deltas
+            ),
+            ignore_conflicts=True,
+        )
+        rows = cls.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+        rows.update(
+            amount=F('amount')
+            + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+            )
+        )
+        rows.filter(amount__lte=0).delete()
+
+    @classmethod
+    def add_recipe(cls, recipe_id, user_ids, sign=1):
+        cls.apply_deltas(
+            user_ids,
+            {
+                ingredient_id: sign * amount
+                for ingredient_id, amount in RecipeIngredient.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('ingredient_id', 'amount')
+            },
+        )
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Автор и дата публикации повторяют поля рецепта, чтобы страница
+    ленты читалась по одному индексу без обращения к рецептам.
+    """
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseName.USER,
+    )
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        verbose_name=VerboseName.RECIPE,
+    )
+    author = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=VerboseName.AUTHOR,
+    )
+    pub_date = models.DateTimeField(verbose_name=VerboseName.PUB_DATE)
+
+    class Meta:
+        default_related_name = 'feed_entries'
+        ordering = ('user', '-pub_date', '-recipe')
+        constraints = (
+            UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_%(class)s'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feedentry_user_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'), name='feedentry_user_author_idx'
+            ),
+        )
+        verbose_name = VerboseName.FEED_ENTRY
+        verbose_name_plural = VerboseNamePlural.FEED_ENTRIES
+
+    def __str__(self) -> str:
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class MediaFile(models.Model):
+    """Число ссылок моделей на файл контентно-адресуемого хранилища."""
+
+    name = models.CharField(
+        verbose_name=VerboseName.MEDIA_FILE_NAME,
+        max_length=FieldLength.MEDIA_FILE_NAME,
+        unique=True,
+    )
+    references = models.PositiveIntegerField(
+        verbose_name=VerboseName.REFERENCES, default=0
+    )
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = VerboseName.MEDIA_FILE
+        verbose_name_plural = VerboseNamePlural.MEDIA_FILES
+
+    def __str__(self) -> str:
+        return f'{self.name} - {self.references}'
+
+    @classmethod
+    def acquire(cls, name):
+        """Добавляет ссылку на файл.
+
+        UPDATE блокирует строку до конца транзакции, и forget() в другой
+        транзакции её не удалит. Если строку успели удалить, она
+        создаётся заново, а файл нужно проверить и записать повторно.
+        """
+        if not name:
+            return
+        files = cls.objects.filter(name=name)
+        while not files.update(references=F('references') + 1):
+            cls.objects.bulk_create((cls(name=name),), ignore_conflicts=True)
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку на файл.
+
+        Возвращает True, если ссылок не осталось. Строка остаётся до
+        forget(), чтобы удаление файла и новые ссылки блокировали её.
+        """
+        if not name:
+            return False
+        files = cls.objects.filter(name=name)
+        files.filter(references__gt=0).update(
+            references=F('references') - 1
+        )
+        return files.filter(references=0).exists()
+
+    @classmethod
+    def forget(cls, name):
+        """Удаляет строку файла без ссылок.
+
+        Возвращает True, если строка удалена и файл можно удалить;
+        блокировка строки держится до конца транзакции.
+        """
+        return bool(cls.objects.filter(name=name, references=0).delete()[0])
@@ -0,0 +1,101 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+COUNT_CACHE_KEY = 'counts:{}'
+
+
+def estimate_count(model, using='default'):
+    """Число строк таблицы модели по статистике планировщика PostgreSQL.
+
+    Возвращает None на других БД и для ещё не проанализированных таблиц.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def cached_count(queryset):
+    """Точное число объектов queryset, хранимое в кэше COUNT_CACHE_TIMEOUT.
+
+    Возвращает пару (число, посчитано ли оно сейчас).
+    """
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    key = COUNT_CACHE_KEY.format(
+        sha256(repr((queryset.db, sql, params)).encode()).hexdigest()
+    )
+    count = cache.get(key)
+    if count is not None:
+        return count, False
+    count = queryset.count()
+    cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count, True
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, не считающий COUNT(*) по большим выборкам.
+
+    Выборки до EXACT_COUNT_THRESHOLD объектов считаются точно запросом
+    с LIMIT. Для нефильтрованной большой таблицы число берётся из
+    pg_class, для остальных больших выборок — из кэша, где точный
+    подсчёт хранится COUNT_CACHE_TIMEOUT секунд. Был ли подсчёт точным,
+    показывает count_is_exact.
+    """
+
+    @cached_property
+    def _count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count, True
+        threshold = settings.EXACT_COUNT_THRESHOLD
+        if not self.object_list.query.where:
+            estimate = estimate_count(
+                self.object_list.model, self.object_list.db
+            )
+            if estimate is not None and estimate > threshold:
+                return estimate, False
+        queryset = self.object_list.order_by().values('pk')
+        count = queryset[:threshold + 1].count()
+        if count <= threshold:
+            return count, True
+        return cached_count(queryset)
+
+    @cached_property
+    def count(self):
+        return self._count[0]
+
+    @property
+    def count_is_exact(self):
+        return self._count[1]
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Оценка бывает меньше фактического числа объектов, поэтому
+            # страницы за её пределами не отвергаются.
+            if self.count_is_exact or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
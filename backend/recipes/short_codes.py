@@ -0,0 +1,132 @@
+import hmac
+from hashlib import sha256
+from string import ascii_letters, digits
+from threading import Lock, local
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+ALPHABET = ascii_letters + digits
+# Старые случайные коды состоят из 6 символов, новые — из 7,
+# поэтому пространства кодов не пересекаются.
+CODE_LENGTH = 7
+DOMAIN = len(ALPHABET) ** CODE_LENGTH
+HALF_BITS = (DOMAIN - 1).bit_length() // 2 + 1
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+# Должен совпадать с шагом последовательности из миграции 0005.
+BLOCK_SIZE = 100
+SEQUENCE = 'recipes_short_code_seq'
+
+
+def _round(key, number, value):
+    digest = hmac.new(
+        key, bytes((number,)) + value.to_bytes(4, 'big'), sha256
+    ).digest()
+    return int.from_bytes(digest[:4], 'big') & HALF_MASK
+
+
+def permute(value, key):
+    """Ключевая перестановка [0, DOMAIN) на сети Фейстеля.
+
+    Сеть переставляет 2 * HALF_BITS бит, а выход за DOMAIN исправляется
+    повторным шифрованием (cycle walking), поэтому разным входам всегда
+    соответствуют разные выходы.
+    """
+    while True:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for number in range(ROUNDS):
+            left, right = right, left ^ _round(key, number, right)
+        value = (left << HALF_BITS) | right
+        if value < DOMAIN:
+            return value
+
+
+def encode(value):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+class ShortCodeAllocator:
+    """Выдаёт уникальные коды из блоков значений последовательности.
+
+    Блок из BLOCK_SIZE значений резервируется одним запросом, остальные
+    коды блока выдаются без обращений к базе. В PostgreSQL nextval()
+    не откатывается вместе с транзакцией, поэтому значения не повторяются.
+
+    В SQLite блок резервируется вставкой строки, которая откатывается
+    вместе с транзакцией, и после отката тот же блок получит следующий
+    резервирующий. Поэтому блок, зарезервированный внутри транзакции,
+    до её фиксации выдаёт коды только ей и отбрасывается при откате,
+    а после фиксации становится общим.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._next = self._end = 0
+        self._local = local()
+
+    def _reserve_block(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT nextval(%s)', (SEQUENCE,))
+                start = cursor.fetchone()[0]
+            else:
+                cursor.execute(f'INSERT INTO {SEQUENCE} DEFAULT VALUES')
+                start = (cursor.lastrowid - 1) * BLOCK_SIZE
+        return start, start + BLOCK_SIZE
+
+    def _take_shared(self):
+        with self._lock:
+            if self._next >= self._end:
+                if connection.vendor != 'postgresql' and (
+                    connection.in_atomic_block
+                ):
+                    return None
+                self._next, self._end = self._reserve_block()
+            value = self._next
+            self._next += 1
+            return value
+
+    def _take_pending(self):
+        pending = getattr(self._local, 'pending', None)
+        # Откат транзакции или точки сохранения убирает из очереди
+        # on_commit и обработчик, фиксирующий блок.
+        if pending is None or not any(
+            entry[1] is pending[1] for entry in connection.run_on_commit
+        ):
+            pending = self._reserve_pending()
+        block = pending[0]
+        if block[0] >= block[1]:
+            block = self._reserve_pending()[0]
+        value = block[0]
+        block[0] += 1
+        return value
+
+    def _reserve_pending(self):
+        block = list(self._reserve_block())
+
+        def share():
+            self._local.pending = None
+            with self._lock:
+                if self._next >= self._end:
+                    self._next, self._end = block
+
+        self._local.pending = (block, share)
+        transaction.on_commit(share)
+        return self._local.pending
+
+    def allocate(self):
+        value = self._take_shared()
+        if value is None:
+            value = self._take_pending()
+        return encode(
+            permute(value, settings.SHORT_URL_CODE_KEY.encode())
+        )
+
+
+short_code_allocator = ShortCodeAllocator()
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import cache
+
+from .models import Recipe
+
+
+CACHE_KEY = 'short_links:{}'
+MISSING = 0
+
+
+class ShortLinkResolver:
+    """Сопоставляет short_url_code с id рецепта.
+
+    Первый уровень — ограниченный LRU процесса с коротким временем жизни,
+    второй — общий кэш Django. Неизвестные коды кэшируются ненадолго.
+    """
+
+    max_size = 10000
+    local_timeout = 60
+    timeout = 60 * 60 * 24
+    missing_timeout = 60
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = OrderedDict()
+
+    def _get_local(self, code):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            if entry[1] < monotonic():
+                del self._entries[code]
+                return None
+            self._entries.move_to_end(code)
+            return entry[0]
+
+    def _set_local(self, code, recipe_id):
+        with self._lock:
+            self._entries[code] = (recipe_id, monotonic() + self.local_timeout)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def resolve_local(self, code):
+        """Ищет код только в LRU процесса, не обращаясь к кэшу и БД.
+
+        Возвращает None, если кода нет в LRU, и MISSING для известного
+        несуществующего кода.
+        """
+        return self._get_local(code)
+
+    def resolve(self, code):
+        recipe_id = self._get_local(code)
+        if recipe_id is None:
+            recipe_id = cache.get(CACHE_KEY.format(code))
+        if recipe_id is None:
+            recipe_id = (
+                Recipe.objects.filter(short_url_code=code)
+                .values_list('id', flat=True)
+                .first()
+            ) or MISSING
+            cache.set(
+                CACHE_KEY.format(code),
+                recipe_id,
+                self.timeout if recipe_id else self.missing_timeout,
+            )
+        self._set_local(code, recipe_id)
+        return recipe_id or None
+
+    def invalidate(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+        cache.delete(CACHE_KEY.format(code))
+
+    def warm(self, links):
+        cache.set_many(
+            {CACHE_KEY.format(code): recipe_id for code, recipe_id in links},
+            self.timeout,
+        )
+
+
+short_link_resolver = ShortLinkResolver()
@@ -0,0 +1,337 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .cache_versions import (
+    author_scope,
+    bump_versions,
+    recipe_scope,
+    recipe_scopes,
+    tag_scope,
+    token_scope,
+)
+from .counters import change_counters
+from .feeds import backfill, schedule_fan_out, trim
+from .images import delete_image, schedule_thumbnails
+from .models import (
+    Favorite,
+    Ingredient,
+    MediaFile,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+    Subscription,
+    Tag,
+    User,
+)
+from .short_links import short_link_resolver
+
+
+INGREDIENTS_SCOPE = 'ingredients'
+TAGS_SCOPE = 'tags'
+USER_UNTRACKED_FIELDS = frozenset(('last_login', 'password'))
+LOGIN_FIELDS = frozenset(('last_login',))
+MEDIA_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+def bump_on_commit(scopes):
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+def bump_now_and_on_commit(scopes):
+    """Меняет версии сразу и ещё раз после фиксации транзакции.
+
+    Второй раз отбрасывает записи, закэшированные другими запросами
+    по данным, которые были в БД до фиксации.
+    """
+    bump_versions(*scopes)
+    bump_on_commit(scopes)
+
+
+def author_scopes(author_id):
+    return {author_scope(author_id)} | recipe_scopes(
+        Recipe.objects.filter(author_id=author_id)
+    )
+
+
+def refresh_thumbnails(instance, field_name, get_scopes):
+    image = getattr(instance, field_name)
+    thumbnails = getattr(instance, f'{field_name}_thumbnails')
+    queryset = type(instance).objects.filter(pk=instance.pk)
+    if not image:
+        if thumbnails:
+            queryset.update(**{f'{field_name}_thumbnails': {}})
+        return
+    if thumbnails.get('source') == image.name:
+        return
+    transaction.on_commit(
+        partial(
+            schedule_thumbnails,
+            queryset,
+            field_name,
+            image.name,
+            lambda: bump_versions(*get_scopes(instance.pk)),
+        )
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_on_commit({INGREDIENTS_SCOPE})
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    bump_on_commit({TAGS_SCOPE})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(short_link_resolver.invalidate, instance.short_url_code)
+        )
+    bump_on_commit(recipe_scopes(Recipe.objects.filter(pk=instance.pk)))
+    refresh_thumbnails(
+        instance,
+        'image',
+        lambda pk: recipe_scopes(Recipe.objects.filter(pk=pk)),
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    bump_on_commit(recipe_scopes(Recipe.objects.filter(pk=instance.pk)))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    # До фиксации другой запрос ещё видит рецепт и вернул бы его в кэш.
+    transaction.on_commit(
+        partial(short_link_resolver.invalidate, instance.short_url_code)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_remove', 'pre_clear', 'post_add'):
+        return
+    if reverse:
+        recipes = Recipe.objects.filter(pk__in=pk_set or ())
+        scopes = {tag_scope(instance.slug)}
+    else:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        scopes = {
+            tag_scope(slug)
+            for slug in Tag.objects.filter(
+                pk__in=pk_set or ()
+            ).values_list('slug', flat=True)
+        }
+    bump_on_commit(scopes | recipe_scopes(recipes))
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, update_fields, **kwargs):
+    refresh_thumbnails(instance, 'avatar', author_scopes)
+    if created or (
+        update_fields and USER_UNTRACKED_FIELDS.issuperset(update_fields)
+    ):
+        return
+    bump_on_commit(author_scopes(instance.pk))
+
+
+def delete_unreferenced_media(storage, name):
+    # Файл удаляется под блокировкой строки MediaFile: acquire() в другой
+    # транзакции либо дождётся конца удаления и запишет файл заново,
+    # либо успеет добавить ссылку, и строка не удалится.
+    with transaction.atomic():
+        if MediaFile.forget(name):
+            delete_image(storage, name)
+
+
+def release_media(model, name):
+    if MediaFile.release(name):
+        transaction.on_commit(
+            partial(
+                delete_unreferenced_media,
+                model._meta.get_field(MEDIA_FIELDS[model]).storage,
+                name,
+            )
+        )
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_media(sender, instance, update_fields, **kwargs):
+    field_name = MEDIA_FIELDS[sender]
+    media = getattr(instance, field_name)
+    # После save() поля содержимое загрузки уже не достать из экземпляра.
+    instance._uploaded_media = (
+        None if not media or media._committed else media.file
+    )
+    if update_fields is not None and field_name not in update_fields:
+        instance._previous_media = None
+        return
+    instance._previous_media = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list(field_name, flat=True)
+        .first()
+        if instance.pk
+        else None
+    ) or ''
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_media_references(sender, instance, **kwargs):
+    previous = instance.__dict__.pop('_previous_media', None)
+    uploaded = instance.__dict__.pop('_uploaded_media', None)
+    if previous is None:
+        return
+    media = getattr(instance, MEDIA_FIELDS[sender])
+    current = media.name or ''
+    if current == previous:
+        return
+    MediaFile.acquire(current)
+    # save() хранилища не пишет существующий файл, а до acquire() его
+    # могла удалить другая транзакция.
+    if current and uploaded is not None:
+        media.storage.restore(current, uploaded)
+    release_media(sender, previous)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def media_owner_deleted(sender, instance, **kwargs):
+    release_media(sender, getattr(instance, MEDIA_FIELDS[sender]).name)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def counted_object_saved(instance, created, **kwargs):
+    if created:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def counted_object_deleted(instance, **kwargs):
+    change_counters(instance, -1)
+
+
+# Суммы продуктов корзин меняются при добавлении рецепта в корзину и
+# удалении из неё, а также при изменении продуктов рецепта, в том числе
+# в админке и при каскадном удалении рецепта или пользователя. Удаление
+# учитывается после удаления строки: когда каскадно удаляются и корзины,
+# и продукты рецепта, вычитает тот обработчик, что сработал первым,
+# а второй уже не находит парных строк. bulk_create(), bulk_update()
+# и _raw_delete() сигналов не вызывают, их изменения учитываются
+# вызывающим кодом.
+def change_cart_totals(recipe_id, deltas):
+    ShoppingCartIngredient.apply_deltas(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        ),
+        deltas,
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_recipe_added(instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.add_recipe(
+            instance.recipe_id, (instance.user_id,)
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_recipe_removed(instance, **kwargs):
+    ShoppingCartIngredient.add_recipe(
+        instance.recipe_id, (instance.user_id,), sign=-1
+    )
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(instance, **kwargs):
+    instance._previous_row = (
+        RecipeIngredient.objects.filter(pk=instance.pk)
+        .values_list('recipe_id', 'ingredient_id', 'amount')
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, **kwargs):
+    previous = instance.__dict__.pop('_previous_row', None)
+    deltas = {instance.ingredient_id: instance.amount}
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        if recipe_id == instance.recipe_id:
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        else:
+            change_cart_totals(recipe_id, {ingredient_id: -amount})
+    change_cart_totals(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, **kwargs):
+    change_cart_totals(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def favorites_changed(instance, **kwargs):
+    bump_on_commit({recipe_scope(instance.recipe_id)})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(schedule_fan_out, instance.pk))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        backfill(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    trim(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    bump_now_and_on_commit({token_scope(instance.key)})
+
+
+@receiver(post_save, sender=User)
+def user_tokens_changed(instance, created, update_fields, **kwargs):
+    if created or (update_fields and LOGIN_FIELDS.issuperset(update_fields)):
+        return
+    scopes = {
+        token_scope(key)
+        for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True
+        )
+    }
+    if scopes:
+        bump_now_and_on_commit(scopes)
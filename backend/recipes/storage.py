@@ -0,0 +1,45 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 их содержимого.
+
+    Одинаковые загрузки сохраняются один раз, а содержимое файла по
+    выданному имени никогда не меняется. Удалять файлы нужно только
+    после того, как на них перестали ссылаться (см. MediaFile).
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return self._save(name, content).replace('\\', '/')
+
+    def restore(self, name, content):
+        """Записывает файл под выданным именем, если его уже удалили."""
+        if not self.exists(name):
+            self._save(name, content)
+
+
+content_addressed_storage = ContentAddressedStorage()
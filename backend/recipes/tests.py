@@ -0,0 +1,463 @@
+import json
+from io import StringIO
+from time import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from .cache_versions import get_version
+from .feeds import PULLED_AT_KEY, pull
+from .importers import read_json_array, read_ndjson
+from .models import (
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingCartIngredient,
+    Subscription,
+    Tag,
+    User,
+)
+from .short_codes import BLOCK_SIZE, ShortCodeAllocator
+from .short_links import MISSING, short_link_resolver
+from .signals import INGREDIENTS_SCOPE, TAGS_SCOPE
+
+
+class ShortCodeAllocatorTests(TransactionTestCase):
+    def allocate(self, allocator, count=3):
+        return {allocator.allocate() for _ in range(count)}
+
+    def test_rolled_back_block_is_not_reused(self):
+        allocator = ShortCodeAllocator()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.allocate(allocator)
+                raise RuntimeError
+        after_rollback = self.allocate(allocator)
+        other = self.allocate(ShortCodeAllocator(), BLOCK_SIZE)
+        self.assertFalse(after_rollback & other)
+
+    def test_rolled_back_savepoint_block_is_not_reused(self):
+        allocator = ShortCodeAllocator()
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.allocate(allocator)
+                    raise RuntimeError
+            after_rollback = self.allocate(allocator)
+            other = self.allocate(ShortCodeAllocator(), BLOCK_SIZE)
+        self.assertFalse(after_rollback & other)
+
+    def test_committed_block_is_shared(self):
+        allocator = ShortCodeAllocator()
+        with transaction.atomic():
+            committed = self.allocate(allocator)
+        self.assertFalse(committed & self.allocate(allocator))
+        self.assertFalse(
+            committed & self.allocate(ShortCodeAllocator(), BLOCK_SIZE)
+        )
+
+
+class JsonReaderTests(SimpleTestCase):
+    def read(self, text, reader=read_json_array):
+        return list(reader(StringIO(text)))
+
+    def test_array(self):
+        for text in ('[]', ' [ ] ', '[{"a": 1}]', '[{"a": 1} , {"b": "]"}]'):
+            with self.subTest(text=text):
+                self.assertEqual(self.read(text), json.loads(text))
+
+    def test_array_across_chunks(self):
+        text = json.dumps([{'name': str(number)} for number in range(50)])
+        with mock.patch('recipes.importers.CHUNK_SIZE', 7):
+            self.assertEqual(self.read(text), json.loads(text))
+
+    def test_malformed_array(self):
+        for text in (
+            '',
+            '{}',
+            '[{"a": 1} {"b": 2}]',
+            '[{"a": 1},, {"b": 2}]',
+            '[, {"a": 1}]',
+            '[{"a": 1},]',
+            '[{"a": 1}',
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    self.read(text)
+
+    def test_not_object(self):
+        for text, reader in (
+            ('[{"a": 1}, 5]', read_json_array),
+            ('[[]]', read_json_array),
+            ('{"a": 1}\n"a"\n', read_ndjson),
+        ):
+            with self.subTest(text=text):
+                with self.assertRaisesMessage(
+                    ValueError, 'не является объектом JSON'
+                ):
+                    self.read(text, reader)
+
+
+class CacheVersionTests(TestCase):
+    """Версии областей меняются только после фиксации изменений."""
+
+    def assertBumpedOnCommit(self, scope, change):
+        version = get_version(scope)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            self.assertEqual(get_version(scope), version)
+        self.assertNotEqual(get_version(scope), version)
+
+    def test_ingredients(self):
+        self.assertBumpedOnCommit(
+            INGREDIENTS_SCOPE,
+            lambda: Ingredient.objects.create(
+                name='salt', measurement_unit='g'
+            ),
+        )
+
+    def test_tags(self):
+        self.assertBumpedOnCommit(
+            TAGS_SCOPE,
+            lambda: Tag.objects.create(name='lunch', slug='lunch'),
+        )
+
+
+class ShortLinkTests(TestCase):
+    """Кэш коротких ссылок сбрасывается после фиксации изменений.
+
+    Запись в кэш внутри транзакции изображает конкурентный запрос,
+    который ещё видит прежнее состояние БД.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.org',
+            password='password',
+            first_name='author',
+            last_name='author',
+        )
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            name='recipe',
+            author=self.author,
+            image='',
+            text='text',
+            cooking_time=1,
+        )
+
+    def test_created_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe()
+            short_link_resolver.warm(((recipe.short_url_code, MISSING),))
+        self.assertEqual(
+            short_link_resolver.resolve(recipe.short_url_code), recipe.id
+        )
+
+    def test_deleted_recipe(self):
+        recipe = self.create_recipe()
+        code, recipe_id = recipe.short_url_code, recipe.id
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+            short_link_resolver.warm(((code, recipe_id),))
+        self.assertIsNone(short_link_resolver.resolve(code))
+
+
+@override_settings(
+    FEED_FANOUT_WORKERS=0,
+    FEED_FANOUT_BATCH_SIZE=1,
+    FEED_FANOUT_MAX_SUBSCRIBERS=3,
+    FEED_BACKFILL_SIZE=2,
+)
+class FeedTests(TestCase):
+    """Ленты подписок: раздача, дозаполнение, очистка и забор."""
+
+    def setUp(self):
+        cache.clear()
+        self.author, self.popular, *self.readers = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'popular', 'first', 'second', 'third')
+        )
+        for reader in self.readers:
+            self.subscribe(reader, self.popular)
+
+    def subscribe(self, reader, author):
+        Subscription.objects.create(subscriber=reader, author=author)
+
+    def publish(self, author, count=1):
+        recipes = []
+        for _ in range(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipes.append(
+                    Recipe.objects.create(
+                        name='recipe',
+                        author=author,
+                        image='',
+                        text='text',
+                        cooking_time=1,
+                    ).id
+                )
+        return recipes
+
+    def feed(self, reader):
+        return set(
+            FeedEntry.objects.filter(user=reader).values_list(
+                'recipe_id', flat=True
+            )
+        )
+
+    def test_fan_out(self):
+        first, second, third = self.readers
+        self.subscribe(first, self.author)
+        self.subscribe(second, self.author)
+        recipes = set(self.publish(self.author))
+        self.assertEqual(self.feed(first), recipes)
+        self.assertEqual(self.feed(second), recipes)
+        self.assertEqual(self.feed(third), set())
+
+    def test_backfill_and_trim(self):
+        reader = self.readers[0]
+        recipes = self.publish(self.author, 3)
+        self.subscribe(reader, self.author)
+        self.assertEqual(self.feed(reader), set(recipes[1:]))
+        Subscription.objects.filter(
+            subscriber=reader, author=self.author
+        ).delete()
+        self.assertEqual(self.feed(reader), set())
+
+    def test_popular_author_is_pulled(self):
+        reader = self.readers[0]
+        recipes = self.publish(self.popular, 3)
+        self.assertEqual(self.feed(reader), set())
+        pull(reader)
+        self.assertEqual(self.feed(reader), set(recipes[1:]))
+
+    def test_pull_after_long_absence_is_capped(self):
+        reader = self.readers[0]
+        pull(reader)
+        cache.set(PULLED_AT_KEY.format(reader.pk), time() - 10 ** 6, None)
+        recipes = self.publish(self.popular, 3)
+        pull(reader)
+        self.assertEqual(self.feed(reader), set(recipes[1:]))
+
+    @mock.patch('recipes.management.commands.rebuild_feeds.BATCH_SIZE', 1)
+    def test_rebuild_feeds(self):
+        first, second, third = self.readers
+        self.subscribe(first, self.author)
+        self.subscribe(second, self.author)
+        recipes = self.publish(self.author, 2)
+        self.publish(self.popular)
+        FeedEntry.objects.filter(user=first).delete()
+        FeedEntry.objects.create(
+            user=third,
+            recipe_id=recipes[0],
+            author=self.author,
+            pub_date=Recipe.objects.get(pk=recipes[0]).pub_date,
+        )
+        out = StringIO()
+        call_command('rebuild_feeds', '--check', stdout=out)
+        self.assertIn('Missing entries: 2', out.getvalue())
+        self.assertIn('Stale entries: 1', out.getvalue())
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed(first), set(recipes))
+        self.assertEqual(self.feed(second), set(recipes))
+        self.assertEqual(self.feed(third), set())
+
+
+class CartTotalsTests(TestCase):
+    """Суммы продуктов корзин следуют за корзинами и рецептами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.first, cls.second = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'first', 'second')
+        )
+        cls.salt, cls.sugar, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='g')
+            for name in ('salt', 'sugar', 'flour')
+        )
+
+    def setUp(self):
+        self.soup = self.create_recipe(
+            self.author, {self.salt: 10, self.sugar: 5}
+        )
+        self.stew = self.create_recipe(self.author, {self.salt: 3})
+        self.bread = self.create_recipe(self.second, {self.flour: 7})
+        for recipe in (self.soup, self.stew, self.bread):
+            ShoppingCart.objects.create(user=self.first, recipe=recipe)
+        ShoppingCart.objects.create(user=self.second, recipe=self.soup)
+
+    def create_recipe(self, author, amounts):
+        recipe = Recipe.objects.create(
+            name='recipe',
+            author=author,
+            image='',
+            text='text',
+            cooking_time=1,
+        )
+        for ingredient, amount in amounts.items():
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+    def assertTotals(self, user, expected):
+        self.assertEqual(
+            dict(
+                ShoppingCartIngredient.objects.filter(user=user).values_list(
+                    'ingredient', 'amount'
+                )
+            ),
+            {ingredient.id: amount for ingredient, amount in expected.items()},
+        )
+        self.assertDrift(0)
+
+    def assertDrift(self, drift):
+        out = StringIO()
+        call_command('rebuild_shopping_cart_totals', '--check', stdout=out)
+        self.assertIn(f'Drifted rows: {drift}', out.getvalue())
+
+    def test_cart_changes(self):
+        self.assertTotals(
+            self.first, {self.salt: 13, self.sugar: 5, self.flour: 7}
+        )
+        self.assertTotals(self.second, {self.salt: 10, self.sugar: 5})
+        ShoppingCart.objects.filter(user=self.first, recipe=self.stew).delete()
+        self.assertTotals(
+            self.first, {self.salt: 10, self.sugar: 5, self.flour: 7}
+        )
+
+    def test_inline_amount_edit(self):
+        row = RecipeIngredient.objects.get(
+            recipe=self.soup, ingredient=self.salt
+        )
+        row.amount = 20
+        row.save()
+        self.assertTotals(
+            self.first, {self.salt: 23, self.sugar: 5, self.flour: 7}
+        )
+        row.ingredient = self.flour
+        row.save()
+        self.assertTotals(
+            self.first, {self.salt: 3, self.sugar: 5, self.flour: 27}
+        )
+        self.assertTotals(self.second, {self.sugar: 5, self.flour: 20})
+
+    def test_ingredient_moved_to_other_recipe(self):
+        row = RecipeIngredient.objects.get(
+            recipe=self.soup, ingredient=self.sugar
+        )
+        row.recipe = self.stew
+        row.save()
+        self.assertTotals(
+            self.first, {self.salt: 13, self.sugar: 5, self.flour: 7}
+        )
+        self.assertTotals(self.second, {self.salt: 10})
+
+    def test_ingredient_row_deleted(self):
+        RecipeIngredient.objects.get(
+            recipe=self.soup, ingredient=self.salt
+        ).delete()
+        self.assertTotals(
+            self.first, {self.salt: 3, self.sugar: 5, self.flour: 7}
+        )
+        self.assertTotals(self.second, {self.sugar: 5})
+
+    def test_recipe_deleted(self):
+        self.soup.delete()
+        self.assertTotals(self.first, {self.salt: 3, self.flour: 7})
+        self.assertTotals(self.second, {})
+
+    def test_author_deleted(self):
+        self.author.delete()
+        self.assertTotals(self.first, {self.flour: 7})
+        self.assertTotals(self.second, {})
+
+    def test_reader_deleted(self):
+        self.first.delete()
+        self.assertTotals(self.first, {})
+        self.assertTotals(self.second, {self.salt: 10, self.sugar: 5})
+
+    def test_rebuild(self):
+        totals = ShoppingCartIngredient.objects.filter(user=self.first)
+        totals.filter(ingredient=self.salt).update(amount=1)
+        totals.filter(ingredient=self.flour).delete()
+        ShoppingCartIngredient.objects.create(
+            user=self.second, ingredient=self.flour, amount=2
+        )
+        self.assertDrift(3)
+        call_command('rebuild_shopping_cart_totals', stdout=StringIO())
+        self.assertTotals(
+            self.first, {self.salt: 13, self.sugar: 5, self.flour: 7}
+        )
+        self.assertTotals(self.second, {self.salt: 10, self.sugar: 5})
+
+
+class CounterFieldsTests(TestCase):
+    """save() не затирает счётчики и не мешает вставке строки."""
+
+    def setUp(self):
+        self.author, self.reader = (
+            User.objects.create_user(
+                username=name,
+                email=f'{name}@example.org',
+                password='password',
+                first_name=name,
+                last_name=name,
+            )
+            for name in ('author', 'reader')
+        )
+
+    def test_stale_instance_keeps_counters(self):
+        for author in (
+            User.objects.get(pk=self.author.pk),
+            User.objects.defer('avatar_thumbnails').get(pk=self.author.pk),
+        ):
+            with self.subTest(deferred=bool(author.get_deferred_fields())):
+                Subscription.objects.create(
+                    subscriber=self.reader, author=self.author
+                )
+                author.first_name = 'renamed'
+                author.save()
+                author.refresh_from_db()
+                self.assertEqual(author.first_name, 'renamed')
+                self.assertEqual(author.subscribers_count, 1)
+                Subscription.objects.all().delete()
+
+    def test_copy(self):
+        copy = User.objects.get(pk=self.author.pk)
+        copy.pk = None
+        copy.username, copy.email = 'copy', 'copy@example.org'
+        copy.save()
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_save_after_concurrent_delete(self):
+        author = User.objects.get(pk=self.author.pk)
+        User.objects.filter(pk=author.pk).delete()
+        author.save()
+        self.assertTrue(User.objects.filter(pk=author.pk).exists())
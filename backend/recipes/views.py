@@ -1,15 +1,28 @@
+from asgiref.sync import sync_to_async
 from django.http import HttpResponsePermanentRedirect
 
-from recipes.models import Recipe
+from recipes.short_links import short_link_resolver
 
 
-def recipe_shared_link(request, slug):
-    try:
-        recipe = Recipe.objects.get(short_url_code=slug)
-    except Recipe.DoesNotExist:
+def redirect_to_recipe(request, recipe_id):
+    if not recipe_id:
         redirect_url = request.build_absolute_uri('/not_found')
     else:
-        redirect_url = request.build_absolute_uri(
-            f'/recipes/{recipe.id}/'
-        )
+        redirect_url = request.build_absolute_uri(f'/recipes/{recipe_id}/')
     return HttpResponsePermanentRedirect(redirect_url)
+
+
+def recipe_shared_link(request, slug):
+    return redirect_to_recipe(request, short_link_resolver.resolve(slug))
+
+
+async def recipe_shared_link_async(request, slug):
+    """Асинхронный вариант recipe_shared_link для запуска под ASGI.
+
+    Коды из LRU процесса отдаются без перехода в поток, остальные
+    разрешаются синхронно через кэш и БД.
+    """
+    recipe_id = short_link_resolver.resolve_local(slug)
+    if recipe_id is None:
+        recipe_id = await sync_to_async(short_link_resolver.resolve)(slug)
+    return redirect_to_recipe(request, recipe_id)